@@ -0,0 +1,21 @@
+"""
+Benchmarks for image_helper. Run them from the repository root, eg.
+
+    python -m benchmarks.instantiation
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup():
+    """
+    Configures Django with the example project's settings.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'example.settings')
+
+    import django
+    django.setup()
@@ -0,0 +1,81 @@
+"""
+Generated images for the benchmarks, so they run offline and always see
+the same input.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+
+def _photo(size):
+    """
+    Something with gradients, edges and noise, that compresses roughly
+    like a photo does.
+    """
+    width, height = size
+    image = Image.merge('RGB', [
+        Image.linear_gradient('L').resize(size),
+        Image.radial_gradient('L').resize(size),
+        Image.effect_noise(size, 48),
+    ])
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, max(width // 12, 1)):
+        draw.ellipse([i, i * height // width, i + width // 6, i * height // width + height // 6],
+                     outline=(255 - i % 255, i % 255, 128), width=max(width // 200, 1))
+    return image
+
+
+def _encode(image, pil_format, **options):
+    handle = BytesIO()
+    image.save(handle, pil_format, **options)
+    return handle.getvalue()
+
+
+def rgba_png(size=(1600, 1200)):
+    image = _photo(size)
+    image.putalpha(Image.linear_gradient('L').resize(size))
+    return 'rgba.png', _encode(image, 'PNG')
+
+
+def cmyk_jpeg(size=(2400, 1600)):
+    return 'cmyk.jpg', _encode(_photo(size).convert('CMYK'), 'JPEG', quality=90)
+
+
+def large_jpeg(size=(6000, 4000)):
+    return 'large.jpg', _encode(_photo(size), 'JPEG', quality=90)
+
+
+def palette_gif(size=(1000, 750)):
+    return 'palette.gif', _encode(_photo(size).convert('P', palette=Image.ADAPTIVE), 'GIF')
+
+
+FIXTURES = {
+    'rgba_png': rgba_png,
+    'cmyk_jpeg': cmyk_jpeg,
+    'large_jpeg': large_jpeg,
+    'palette_gif': palette_gif,
+}
+
+
+def phone_photos(count=8, size=(4032, 3024)):
+    """
+    JPEGs as phones take them: sideways, with EXIF including a large maker
+    note (where previews are kept), and an ICC profile.
+
+    :returns:
+        A list of (name, bytes).
+    """
+    from PIL import ImageCms
+
+    icc_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+    photos = []
+    for i in range(count):
+        exif = Image.Exif()
+        exif[0x0112] = (1, 6, 8, 3)[i % 4]
+        exif[0x010f] = 'Phone'
+        exif[0x0110] = 'Phone {}'.format(i)
+        exif[0x8769] = {0x9003: '2024:01:01 12:00:00', 0x927c: bytes(range(256)) * 160}
+        image = _photo(size).rotate(90 * i, expand=False)
+        data = _encode(image, 'JPEG', quality=90, exif=exif.tobytes(), icc_profile=icc_profile)
+        photos.append(('phone_{}.jpg'.format(i), data))
+    return photos
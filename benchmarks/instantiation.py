@@ -0,0 +1,62 @@
+"""
+Measures the cost of instantiating model instances with and without a
+SizedImageField, and of accessing their thumbnail.
+
+    python -m benchmarks.instantiation [--count 100000]
+"""
+import argparse
+import timeit
+
+from benchmarks import setup
+
+setup()
+
+from django.db import models  # noqa: E402
+
+from image_helper.fields import SizedImageField  # noqa: E402
+
+
+class CharFieldModel(models.Model):
+    image = models.CharField(max_length=100)
+
+    class Meta:
+        app_label = 'test_app'
+        managed = False
+
+
+class SizedImageFieldModel(models.Model):
+    image = SizedImageField(upload_to='images', size=(220, 150), thumbnail_size=(100, 100))
+
+    class Meta:
+        app_label = 'test_app'
+        managed = False
+
+
+def instantiate(model, count):
+    for pk in range(count):
+        model(id=pk, image='images/photo.jpg')
+
+
+def instantiate_and_access_thumbnail(model, count):
+    for pk in range(count):
+        model(id=pk, image='images/photo.jpg').image.thumbnail.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [
+        ("without SizedImageField", instantiate, CharFieldModel),
+        ("with SizedImageField", instantiate, SizedImageFieldModel),
+        ("with SizedImageField, thumbnail accessed", instantiate_and_access_thumbnail, SizedImageFieldModel),
+    ]
+    for label, func, model in cases:
+        best = min(timeit.repeat(lambda: func(model, args.count), number=1, repeat=args.repeat))
+        print("{:<45} {:>8.3f}s  {:>6.2f}us/instance".format(label, best, best / args.count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Reports the bytes metadata adds to renditions of phone photos, carried
+over as the upload has it, kept with ``keep_metadata`` and stripped (the
+default).
+
+    python -m benchmarks.metadata [--count 8] [--source 4032x3024]
+
+"Carried" saves each rendition with the upload's EXIF, maker note included,
+and ICC profile. The savings are of stripping compared to that.
+"""
+import argparse
+from collections import OrderedDict
+from io import BytesIO
+
+from benchmarks import setup
+
+setup()
+
+from django.core.files.base import ContentFile  # noqa: E402
+
+from PIL import Image  # noqa: E402
+
+from benchmarks.fixtures import phone_photos  # noqa: E402
+from image_helper.fields import SizedImageField  # noqa: E402
+
+SIZES = OrderedDict([('large', (1200, 1200)), ('medium', (400, 400)), ('thumbnail', (100, 100))])
+FORMATS = OrderedDict([('JPEG', '.jpg'), ('WEBP', '.webp'), ('PNG', '.png')])
+
+
+def carried(image, upload, pil_format):
+    handle = BytesIO()
+    image.save(handle, pil_format, exif=upload.info.get('exif', b''), icc_profile=upload.info.get('icc_profile'))
+    return handle.tell()
+
+
+def encoded(field, image, filename, keep_metadata):
+    return field._get_simple_uploaded_file(image, filename, {'keep_metadata': keep_metadata}).size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=8)
+    parser.add_argument('--source', default='4032x3024', help="Size of the generated photos.")
+    args = parser.parse_args()
+
+    photos = phone_photos(args.count, tuple(int(dimension) for dimension in args.source.split('x')))
+    field = SizedImageField()
+    totals = OrderedDict(((pil_format, rendition), [0, 0, 0]) for pil_format in FORMATS for rendition in SIZES)
+    for name, data in photos:
+        upload = Image.open(BytesIO(data))
+        image = field._open_image(ContentFile(data, name=name))
+        for rendition, size in SIZES.items():
+            resized = field._do_resize(image.copy(), size + (False,))
+            for pil_format, extension in FORMATS.items():
+                filename = rendition + extension
+                total = totals[pil_format, rendition]
+                total[0] += carried(resized, upload, pil_format)
+                total[1] += encoded(field, resized, filename, True)
+                total[2] += encoded(field, resized, filename, False)
+
+    print("{:<6} {:<10} {:>10} {:>10} {:>10} {:>8}".format(
+        'format', 'rendition', 'carried', 'kept', 'stripped', 'saved'))
+    for (pil_format, rendition), (carried_bytes, kept_bytes, stripped_bytes) in totals.items():
+        print("{:<6} {:<10} {:>10} {:>10} {:>10} {:>7.1f}%".format(
+            pil_format, rendition, carried_bytes // len(photos), kept_bytes // len(photos),
+            stripped_bytes // len(photos), 100.0 * (carried_bytes - stripped_bytes) / carried_bytes))
+
+
+if __name__ == '__main__':
+    main()
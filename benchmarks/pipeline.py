@@ -0,0 +1,283 @@
+"""
+Measures the SizedImageField save pipeline on generated fixtures and
+compares the results to a stored baseline.
+
+    python -m benchmarks.pipeline                   # compare to baseline.json
+    python -m benchmarks.pipeline --save-baseline   # record a new baseline
+
+The field's own ``_open_image``, ``_render_renditions`` and ``_process`` are
+run on every fixture. For each of them it reports the best wall time, the
+peak of Python allocations (tracemalloc) and the resident memory its output
+holds on to. The stages ``_process`` goes through (open, orient, convert,
+resize, rendition, encode, placeholder and storage_save) are timed by
+``image_helper.metrics.measure_stage``, reported with the bytes they wrote.
+
+Times are compared to the baseline relative to a fixed Pillow workload
+timed in the same process, so a baseline recorded on another machine still
+applies. Exits with 1 when something got slower, bigger or wrote more bytes
+than the baseline allows.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from benchmarks import setup
+
+setup()
+
+from django.core.files.base import ContentFile  # noqa: E402
+from django.core.files.storage import FileSystemStorage  # noqa: E402
+
+from PIL import Image  # noqa: E402
+
+from benchmarks.fixtures import FIXTURES  # noqa: E402
+from image_helper.fields import SizedImageField  # noqa: E402
+from image_helper.signals import image_stage_finished  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Measurements below these are noise.
+FLOORS = {'time': 0.01, 'rss': 4 * 1024 * 1024, 'traced_peak': 1024 * 1024, 'bytes': 1024}
+
+
+def _current_rss():
+    """
+    Resident memory in bytes, from /proc where there is one.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def calibrate(repeat=5):
+    """
+    Returns the best time of a fixed Pillow resize and encode, the unit
+    times are compared to the baseline in.
+    """
+    image = Image.merge('RGB', [Image.linear_gradient('L').resize((1024, 1024)),
+                                Image.radial_gradient('L').resize((1024, 1024)),
+                                Image.effect_noise((1024, 1024), 48)])
+    best = float('inf')
+    for run in range(repeat):
+        started = time.perf_counter()
+        image.resize((512, 512), Image.LANCZOS).save(BytesIO(), 'JPEG', quality=85)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def get_field(location, **options):
+    options.setdefault('size', (1200, 1200))
+    options.setdefault('thumbnail_size', (200, 200))
+    options.setdefault('renditions', {'medium': (600, 600), 'small': (100, 100)})
+    field = SizedImageField(upload_to='bench', storage=FileSystemStorage(location=location), **options)
+    field.name = 'image'
+    return field
+
+
+def _open_image(field, state):
+    state['image'] = field._open_image(ContentFile(state['data'], name=state['name']))
+
+
+def _render_renditions(field, state):
+    state['renditions'] = list(field._render_renditions(state['image'], state['name']))
+
+
+def _process(field, state):
+    encoded = field._process(ContentFile(state['data'], name=state['name']), state['name'])
+    field._save_file(state['name'], encoded)
+
+
+STEPS = OrderedDict([
+    ('open_image', _open_image),
+    ('render_renditions', _render_renditions),
+    ('process', _process),
+])
+
+
+class StageRecorder(object):
+    """
+    Adds up the duration and bytes written of the stages a field reports
+    while it's recording.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.stages = None
+
+    def __enter__(self):
+        self.stages = defaultdict(lambda: {'time': 0.0, 'bytes': 0})
+        image_stage_finished.connect(self.record)
+        return self.stages
+
+    def __exit__(self, *exc_info):
+        image_stage_finished.disconnect(self.record)
+
+    def record(self, field, stage, duration, bytes_written=None, **kwargs):
+        if field is self.field:
+            self.stages[stage]['time'] += duration
+            self.stages[stage]['bytes'] += bytes_written or 0
+
+
+def _best(result, elapsed, unit):
+    result['time'] = min(result.get('time', float('inf')), elapsed)
+    result['relative_time'] = min(result.get('relative_time', float('inf')), elapsed / unit)
+
+
+def measure(field, name, data, repeat=3):
+    """
+    Runs every step `repeat` times on a fixture, each time after timing the
+    reference workload of `calibrate` so both see the same machine load.
+
+    :returns:
+        A dict of the ``OrderedDict`` of each step's measurements under
+        'steps', of each stage of ``_process`` under 'stages'.
+    """
+    steps = OrderedDict((step, {}) for step in STEPS)
+    stages = OrderedDict()
+    recorder = StageRecorder(field)
+    for run in range(repeat):
+        unit = calibrate()
+        state = {'name': 'bench/' + name, 'data': data}
+        for step, func in STEPS.items():
+            rss_before = _current_rss()
+            tracemalloc.start()
+            with recorder as recorded:
+                started = time.perf_counter()
+                func(field, state)
+                elapsed = time.perf_counter() - started
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            _best(steps[step], elapsed, unit)
+            if run == 0:
+                steps[step]['traced_peak'] = traced_peak
+                steps[step]['rss'] = max(_current_rss() - rss_before, 0)
+        shutil.rmtree(field.storage.path('bench'), ignore_errors=True)
+
+        # The stages the last step, _process, went through.
+        for stage, recorded_stage in recorded.items():
+            _best(stages.setdefault(stage, {'bytes': recorded_stage['bytes']}), recorded_stage['time'], unit)
+    return {'steps': steps, 'stages': stages}
+
+
+def _run_fixture(fixture, repeat, field_options):
+    location = tempfile.mkdtemp()
+    try:
+        name, data = FIXTURES[fixture]()
+        return measure(get_field(location, **field_options), name, data, repeat)
+    finally:
+        shutil.rmtree(location)
+
+
+def run(fixtures, repeat, **field_options):
+    """
+    Measures every fixture in a fresh process, so memory figures aren't
+    skewed by what earlier fixtures left allocated.
+    """
+    report = OrderedDict()
+    for fixture in fixtures:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            report[fixture] = executor.submit(_run_fixture, fixture, repeat, field_options).result()
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """
+    :returns:
+        A list of messages describing the steps and stages that regressed.
+    """
+    regressions = []
+    for fixture, groups in report.items():
+        for group, results in groups.items():
+            for name, result in results.items():
+                expected = baseline.get(fixture, {}).get(group, {}).get(name)
+                if not expected:
+                    continue
+                for metric, slack in (('relative_time', tolerance), ('rss', tolerance),
+                                      ('traced_peak', tolerance), ('bytes', 0.01)):
+                    if metric not in result or metric not in expected:
+                        continue
+                    allowed = expected[metric] * (1 + slack)
+                    if metric == 'relative_time':
+                        floor = FLOORS['time'] * result['relative_time'] / result['time'] if result['time'] else 0
+                    else:
+                        floor = FLOORS[metric]
+                    if result[metric] > max(allowed, expected[metric] + floor):
+                        regressions.append("{} {} {}: {:.4g} > baseline {:.4g}".format(
+                            fixture, name, metric, result[metric], expected[metric]))
+    return regressions
+
+
+def _change(result, expected):
+    if expected and expected.get('relative_time'):
+        return "  {:+.0%}".format(result['relative_time'] / expected['relative_time'] - 1)
+    return ""
+
+
+def print_report(report, baseline=None):
+    baseline = baseline or {}
+    print("{:<12} {:<18} {:>10} {:>12} {:>12}".format('fixture', 'step', 'time (ms)', 'traced (KB)', 'rss (KB)'))
+    for fixture, groups in report.items():
+        for step, result in groups['steps'].items():
+            print("{:<12} {:<18} {:>10.2f} {:>12.0f} {:>12.0f}".format(
+                fixture, step, result['time'] * 1000, result['traced_peak'] / 1024.0, result['rss'] / 1024.0
+            ) + _change(result, baseline.get(fixture, {}).get('steps', {}).get(step)))
+    print("")
+    print("{:<12} {:<18} {:>10} {:>12}".format('fixture', 'stage', 'time (ms)', 'bytes'))
+    for fixture, groups in report.items():
+        for stage, result in groups['stages'].items():
+            print("{:<12} {:<18} {:>10.2f} {:>12}".format(
+                fixture, stage, result['time'] * 1000, result['bytes']
+            ) + _change(result, baseline.get(fixture, {}).get('stages', {}).get(stage)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fixture', action='append', choices=sorted(FIXTURES),
+                        help="Fixture to run, can be repeated. Defaults to all of them.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Allowed relative increase over the baseline.")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    report = run(args.fixture or sorted(FIXTURES), args.repeat)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print("Saved baseline to {}".format(args.baseline))
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, baseline)
+
+    regressions = compare(report, baseline, args.tolerance)
+    for regression in regressions:
+        print("REGRESSION " + regression, file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
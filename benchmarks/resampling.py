@@ -0,0 +1,65 @@
+"""
+Compares the resize throughput of the resample presets to a plain
+Lanczos resize of the full image (no reducing_gap), on a thumbnail heavy
+workload.
+
+    python -m benchmarks.resampling [--count 20] [--source 3000x2000]
+
+Besides the time per image it prints the mean absolute difference of each
+preset's output from the full Lanczos resize, in 0-255 levels.
+"""
+import argparse
+import timeit
+
+from benchmarks import setup
+
+setup()
+
+from PIL import Image, ImageChops, ImageStat  # noqa: E402
+
+from benchmarks.fixtures import _photo  # noqa: E402
+from image_helper.fields import RESAMPLE_PRESETS, SizedImageField  # noqa: E402
+
+SIZES = [(1200, 1200), (400, 400), (200, 200), (100, 100)]
+
+
+def full_lanczos(image, size):
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS, reducing_gap=None)
+    return image
+
+
+def preset(field, options):
+    def resize(image, size):
+        return field._do_resize(image.copy(), size + (False,), options)
+    return resize
+
+
+def difference(a, b):
+    return sum(ImageStat.Stat(ImageChops.difference(a, b)).mean) / 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--source', default='3000x2000', help="Size of the generated source image.")
+    args = parser.parse_args()
+
+    source = _photo(tuple(int(dimension) for dimension in args.source.split('x')))
+    field = SizedImageField()
+    cases = [('lanczos', full_lanczos)]
+    cases += [(name, preset(field, {'resample': name})) for name in sorted(RESAMPLE_PRESETS)]
+
+    print("{:<10} {:>14} {:>12}".format('resample', 'ms per image', 'difference'))
+    for label, resize in cases:
+        def workload():
+            for size in SIZES:
+                resize(source, size)
+        best = min(timeit.repeat(workload, number=args.count, repeat=args.repeat))
+        diff = sum(difference(resize(source, size), full_lanczos(source, size)) for size in SIZES) / len(SIZES)
+        print("{:<10} {:>14.2f} {:>12.2f}".format(label, best / args.count * 1000, diff))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,10 @@ from sample.models import TestModel
 class TestModelAdmin(admin.ModelAdmin):
     list_display = ['preview_thumbnail', 'name']
 
+    def get_queryset(self, request):
+        # Resolves the thumbnail urls of a whole changelist page at once.
+        return super(TestModelAdmin, self).get_queryset(request).prefetch_renditions('image', ['thumbnail'])
+
     def preview_thumbnail(self, obj):
         return mark_safe('<img src="{}" />'.format(obj.image.thumbnail.url))
 
@@ -120,6 +120,7 @@ INSTALLED_APPS = (
     'django.contrib.admin',
     # Uncomment the next line to enable admin documentation:
     # 'django.contrib.admindocs',
+    'image_helper',
     'sample',
     'image_helper.tests.test_app.apps.TestAppConfig',
 )
@@ -15,6 +15,9 @@ urlpatterns = [
 
     # Uncomment the next line to enable the admin:
     url(r'^admin/', admin.site.urls),
+
+    # Renditions declared with on_demand=True are generated here.
+    url(r'^images/', include('image_helper.urls')),
 ]
 
 # serve media files for sample stuff to work.
@@ -0,0 +1,99 @@
+"""
+A cache of storage lookups for rendition files, so rendering a list of
+thumbnails doesn't cost a storage round trip per row.
+
+Entries are stored in the ``IMAGE_HELPER_CACHE`` cache, one per storage and
+file name, and are removed whenever the file is written again.
+"""
+import hashlib
+
+from django.core.cache import caches
+
+from image_helper.conf import get_setting
+
+
+def _get_cache():
+    alias = get_setting('CACHE')
+    return caches[alias] if alias else None
+
+
+def _get_cache_key(storage, name):
+    if hasattr(storage, 'deconstruct'):
+        path, args, kwargs = storage.deconstruct()
+        storage_name = repr((path, args, sorted(kwargs.items())))
+    else:
+        storage_name = '{}.{}'.format(type(storage).__module__, type(storage).__name__)
+    digest = hashlib.md5('{}:{}'.format(storage_name, name).encode('utf-8')).hexdigest()
+    return 'image_helper:{}'.format(digest)
+
+
+def _is_cacheable(key, value):
+    """
+    Files that don't exist yet aren't remembered: they're created by other
+    processes (task workers, other web workers), whose invalidation only
+    reaches a shared cache.
+    """
+    return key != 'exists' or value
+
+
+def get_file_metadata(storage, name, key, compute):
+    """
+    Returns a cached lookup about a stored file.
+
+    :param key:
+        What is looked up, eg. 'url', 'size' or 'exists'.
+
+    :param compute:
+        Called to do the lookup when it isn't cached.
+    """
+    cache = _get_cache()
+    if cache is None:
+        return compute()
+
+    cache_key = _get_cache_key(storage, name)
+    metadata = cache.get(cache_key) or {}
+    if key not in metadata:
+        value = compute()
+        if not _is_cacheable(key, value):
+            return value
+        metadata[key] = value
+        cache.set(cache_key, metadata, get_setting('CACHE_TIMEOUT'))
+    return metadata[key]
+
+
+def get_many_file_metadata(storage, names, key, compute_many):
+    """
+    Returns a cached lookup about several stored files, with one cache
+    round trip to read them and one to store the ones that were missing.
+
+    :param compute_many:
+        Called with the list of names that aren't cached, returns a dict
+        of name to the result of the lookup.
+
+    :returns:
+        A dict of name to the result of the lookup.
+    """
+    cache = _get_cache()
+    if cache is None:
+        return compute_many(list(names))
+
+    cache_keys = dict((name, _get_cache_key(storage, name)) for name in names)
+    cached = cache.get_many(list(cache_keys.values()))
+    metadata = dict((name, cached.get(cache_key) or {}) for name, cache_key in cache_keys.items())
+    missing = [name for name, values in metadata.items() if key not in values]
+    if missing:
+        computed = compute_many(missing)
+        for name, value in computed.items():
+            metadata[name][key] = value
+        cache.set_many(dict((cache_keys[name], metadata[name]) for name in missing
+                            if _is_cacheable(key, computed.get(name))), get_setting('CACHE_TIMEOUT'))
+    return dict((name, values[key]) for name, values in metadata.items())
+
+
+def invalidate_file_metadata(storage, name):
+    """
+    Forgets the cached lookups of a file that was just written or deleted.
+    """
+    cache = _get_cache()
+    if cache is not None:
+        cache.delete(_get_cache_key(storage, name))
@@ -0,0 +1,54 @@
+from django.conf import settings
+
+DEFAULTS = {
+    # Let Pillow decode JPEGs at a reduced DCT scale when the target size
+    # is much smaller than the upload.
+    'DRAFT_DECODE': True,
+    # Runs the resize work of fields with `deferred=True`.
+    'TASK_BACKEND': 'image_helper.tasks.ThreadPoolBackend',
+    'TASK_WORKERS': 2,
+    # Cache alias rendition url, size and existence lookups are kept in,
+    # None to disable. Keep the timeout below the expiry of signed urls.
+    'CACHE': 'default',
+    'CACHE_TIMEOUT': 300,
+    # Encoded images larger than this many bytes are spooled to a temporary
+    # file. None uses FILE_UPLOAD_MAX_MEMORY_SIZE.
+    'SPOOL_MAX_SIZE': None,
+    # How the rendition view answers once the rendition exists: 'redirect'
+    # to the storage url, or 'serve' the file itself.
+    'ON_DEMAND_RESPONSE': 'redirect',
+    'ON_DEMAND_MAX_AGE': 60 * 60 * 24,
+    # Seconds a request waits for another one generating the same rendition.
+    'ON_DEMAND_LOCK_TIMEOUT': 30,
+    # Dotted path of a metrics sink receiving the timing of every stage, eg.
+    # 'image_helper.metrics.StatsdMetricsSink'.
+    'METRICS_SINK': None,
+    'STATSD_ADDRESS': ('localhost', 8125),
+    # Images a field with `delete_with_model` or `delete_on_replace` deletes
+    # per query and storage batch.
+    'DELETE_BATCH_SIZE': 500,
+    # Largest image, in pixels and in bytes, any SizedImageField decodes.
+    # None for no limit. Fields can set their own with max_pixels and
+    # max_bytes.
+    'MAX_PIXELS': None,
+    'MAX_BYTES': None,
+    # What happens to images over the pixel budget: 'reject' them, or
+    # 'draft' decode JPEGs at a reduced scale that fits (others are
+    # rejected).
+    'OVER_BUDGET': 'reject',
+    # How many images a process decodes and resizes at once, None for no
+    # limit, and how many seconds an image waits for its turn.
+    'MAX_CONCURRENT_RESIZES': None,
+    'RESIZE_WAIT_TIMEOUT': 30,
+    # Threads writing the renditions of fields with `concurrent_writes`,
+    # shared by all of them.
+    'WRITE_WORKERS': 8,
+}
+
+
+def get_setting(name):
+    """
+    Returns the project's ``IMAGE_HELPER_<name>`` setting, falling back to
+    the default defined here.
+    """
+    return getattr(settings, 'IMAGE_HELPER_' + name, DEFAULTS[name])
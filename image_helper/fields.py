@@ -1,16 +1,92 @@
 import os
 
-from io import BytesIO
+from tempfile import SpooledTemporaryFile
 
+import hashlib
+import logging
 import mimetypes
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from functools import partial
+from io import BytesIO, UnsupportedOperation
 
-from django.db.models.fields.files import ImageField
-from django.core.files.uploadedfile import SimpleUploadedFile
-from django.db.models import signals
+import django
+from django.db.models.fields.files import ImageField, ImageFieldFile, ImageFileDescriptor
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.images import get_image_dimensions
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.urls import reverse
 
-from PIL import Image
+from PIL import Image, ImageOps
 
-# todo: Add 'delete_with_model' option that will delete thumbnail and image when model is deleted.
+try:
+    from PIL import ImageCms
+except ImportError:  # Pillow built without Little CMS.
+    ImageCms = None
+
+from image_helper.cache import get_file_metadata, invalidate_file_metadata
+from image_helper.conf import get_setting
+from image_helper.limits import get_draft_size, resize_slot
+from image_helper.metrics import measure_stage
+from image_helper.naming import get_naming
+from image_helper.placeholders import PLACEHOLDERS
+from image_helper.tasks import get_backend, get_write_executor, process_image, render_upload
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {
+    'AVIF': '.avif',
+    'GIF': '.gif',
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+}
+
+ENCODE_OPTIONS = ('quality', 'optimize', 'progressive', 'lossless')
+
+# EXIF orientations that turn the image a quarter, swapping its width and
+# height.
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Resampling filter and reducing_gap of each `resample` preset. reducing_gap
+# lets PIL shrink by whole factors with a fast box filter before applying
+# the filter, the smaller it is the more of the work the box filter does.
+RESAMPLE_PRESETS = {
+    'quality': (Image.LANCZOS, 3.0),
+    'balanced': (Image.LANCZOS, 2.0),
+    'fast': (Image.BILINEAR, 1.5),
+}
+
+# Pillow filters `resample` can also name.
+RESAMPLE_FILTERS = dict((name, getattr(Image, name.upper()))
+                        for name in ('nearest', 'box', 'bilinear', 'hamming', 'bicubic', 'lanczos'))
+
+
+class ImageProbe(namedtuple('ImageProbe', 'format size mode orientation')):
+    """
+    What an upload's header says about it, kept on the upload so it's only
+    parsed once.
+    """
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @property
+    def oriented_size(self):
+        """
+        The size of the image once its EXIF orientation is applied.
+        """
+        return self.size[::-1] if self.orientation in TRANSPOSED_ORIENTATIONS else self.size
 
 
 def _get_thumbnail_filename(filename, append_text="-thumbnail"):
@@ -21,23 +97,66 @@ def _get_thumbnail_filename(filename, append_text="-thumbnail"):
     return ''.join([name, append_text, ext])
 
 
+def _get_format_extension(pil_format):
+    """
+    Returns the extension files saved in `pil_format` are named with.
+    """
+    return FORMAT_EXTENSIONS.get(pil_format.upper(), '.' + pil_format.lower())
+
+
+def _get_format_filename(filename, pil_format):
+    """
+    Returns the file name with the extension of `pil_format` (eg. WEBP ->
+    .webp), or unchanged when it already has one of its extensions.
+    """
+    name, ext = os.path.splitext(filename)
+    if not pil_format or Image.registered_extensions().get(ext.lower()) == pil_format.upper():
+        return filename
+    return name + _get_format_extension(pil_format)
+
+
+def _check_format(pil_format):
+    """
+    Raises a ValueError when the installed Pillow can't save `pil_format`
+    under the extension the field names its files with.
+    """
+    extension = _get_format_extension(pil_format)
+    if Image.registered_extensions().get(extension) != pil_format.upper() or pil_format.upper() not in Image.SAVE:
+        raise ValueError("Pillow can't save {!r} images as {}, is its plugin installed?".format(pil_format, extension))
+
+
 class ThumbnailField(object):
     """
     Instances of this class will be used to access data of the
     generated thumbnails. A thumbnail is created when the image is saved
     initially, but there's nothing persisted that references the thumbnail.
-    When the `SizedImageField` is instantiated, it gets this thumbnail
-    field attached to it where the thumbnail becomes accessible.
+    The first time a thumbnail is accessed on the field's file, one of
+    these is built and kept on the file.
 
     for example: `image.thumbnail.url`
     """
 
-    def __init__(self, name, storage):
+    def __init__(self, name, storage, fallback_name=None, placeholder_url=None, generate_url=None, metadata=None):
         """
         Uses same storage as the parent field
+
+        When the thumbnail is generated in the background, `url` returns
+        `placeholder_url`, or the url of `fallback_name`, until it exists.
+        When it's generated on demand, `url` returns `generate_url` instead.
+
+        `metadata` is what the field's `metadata_field` recorded about the
+        thumbnail, its size and dimensions are read from it.
         """
         self.name = name
         self.storage = storage
+        self.fallback_name = fallback_name
+        self.placeholder_url = placeholder_url
+        self.generate_url = generate_url
+        self.metadata = metadata
+        # Lookups resolved in bulk by `image_helper.prefetch`.
+        self._prefetched = {}
+        if metadata:
+            self._prefetched.update(size=metadata['bytes'], exists=True)
 
     @property
     def path(self):
@@ -45,17 +164,150 @@ class ThumbnailField(object):
 
     @property
     def url(self):
-        return self.storage.url(self.name)
+        if self.needs_exists_check and not self.exists():
+            return self.generate_url or self.placeholder_url or self.storage.url(self.fallback_name)
+        return self._get_metadata('url')
 
     @property
     def size(self):
-        return self.storage.size(self.name)
+        return self._get_metadata('size')
+
+    @property
+    def width(self):
+        return self._get_dimensions()[0]
+
+    @property
+    def height(self):
+        return self._get_dimensions()[1]
+
+    def _get_dimensions(self):
+        if self.metadata:
+            return self.metadata['width'], self.metadata['height']
+        return get_file_metadata(self.storage, self.name, 'dimensions', self._read_dimensions)
+
+    def _read_dimensions(self):
+        with self.storage.open(self.name) as file:
+            return get_image_dimensions(file)
+
+    @property
+    def needs_exists_check(self):
+        """
+        Whether `url` has to know if the file exists yet.
+        """
+        return bool(self.generate_url or self.fallback_name)
+
+    def exists(self):
+        return self._get_metadata('exists')
+
+    def _get_metadata(self, key):
+        if key in self._prefetched:
+            return self._prefetched[key]
+        return get_file_metadata(self.storage, self.name, key, partial(getattr(self.storage, key), self.name))
+
+
+class SizedImageFieldFile(ImageFieldFile):
+    """
+    The file of a `SizedImageField`. Renditions are exposed as attributes,
+    built the first time they're accessed so loading model instances costs
+    nothing for renditions that aren't used.
+    """
+
+    def __getattr__(self, name):
+        field = self.__dict__.get('field')
+        if field is None or not self or not (
+                name in field.renditions or (name == 'webp' and field.encode_options.get('webp'))):
+            raise AttributeError(
+                "'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+        renditions = self.__dict__.setdefault('_renditions', {})
+        key = (name, self.name)
+        if key not in renditions:
+            renditions[key] = field._get_rendition_file(self, name)
+        return renditions[key]
+
+    @property
+    def metadata(self):
+        """
+        What the field's `metadata_field` recorded about this image, or None.
+        """
+        return self.field._get_image_metadata(self)
+
+    @property
+    def placeholder(self):
+        """
+        The placeholder the field's `placeholder_field` recorded for this
+        image, or None.
+        """
+        if not self.field.placeholder_field or not self:
+            return None
+        return getattr(self.instance, self.field.placeholder_field) or None
+
+    @property
+    def size(self):
+        metadata = self.metadata
+        if metadata and self._committed:
+            return metadata['bytes']
+        return super(SizedImageFieldFile, self).size
+
+    def _get_image_dimensions(self):
+        metadata = self.metadata
+        if metadata and self._committed:
+            return metadata['width'], metadata['height']
+        if not self._committed:
+            probe = self.field._probe(self.file)
+            if probe is not None:
+                return probe.oriented_size
+        return super(SizedImageFieldFile, self)._get_image_dimensions()
+
+
+class SizedImageFileDescriptor(ImageFileDescriptor):
+    """
+    Remembers the name an instance was loaded with, so a field with
+    `delete_on_replace` knows which image to delete once it's replaced.
+    """
+
+    def __set__(self, instance, value):
+        if self.field.delete_on_replace and self.field.attname not in instance.__dict__ \
+                and isinstance(value, str):
+            instance.__dict__[self.field._get_stored_name_key()] = value
+        super(SizedImageFileDescriptor, self).__set__(instance, value)
+
+
+class _SpooledImageFile(SpooledTemporaryFile):
+    """
+    A ``SpooledTemporaryFile`` that has no file descriptor until it's over
+    `max_size`. PIL asks encoders such as JPEG's for one, which would
+    otherwise roll every encoding over to disk.
+    """
+
+    def fileno(self):
+        if not self._rolled:
+            raise UnsupportedOperation("fileno")
+        return super(_SpooledImageFile, self).fileno()
+
+
+class _DeleteBatch(object):
+    """
+    The images a field deletes once the current transaction commits.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.names = set()
+
+    def __call__(self):
+        names = sorted(self.names)
+        batch_size = get_setting('DELETE_BATCH_SIZE')
+        for start in range(0, len(names), batch_size):
+            self.field._delete_images(names[start:start + batch_size])
 
 
 class SizedImageField(ImageField):
     """
     An Image field that allows auto resizing auto creation of thumbnails.
     """
+    attr_class = SizedImageFieldFile
+    descriptor_class = SizedImageFileDescriptor
 
     def __init__(self,
                  verbose_name=None,
@@ -64,6 +316,29 @@ class SizedImageField(ImageField):
                  height_field=None,
                  size=None,
                  thumbnail_size=None,
+                 renditions=None,
+                 deferred=False,
+                 placeholder_url=None,
+                 format=None,
+                 quality=None,
+                 optimize=None,
+                 progressive=None,
+                 lossless=None,
+                 webp=False,
+                 content_addressed=False,
+                 on_demand=False,
+                 resample='balanced',
+                 reducing_gap=None,
+                 delete_with_model=False,
+                 delete_on_replace=False,
+                 metadata_field=None,
+                 max_pixels=None,
+                 max_bytes=None,
+                 concurrent_writes=False,
+                 naming='available',
+                 placeholder_field=None,
+                 placeholder='blurhash',
+                 keep_metadata=None,
                  **kwargs):
         """
         Added fields:
@@ -72,17 +347,196 @@ class SizedImageField(ImageField):
                 (None for not resizing).
             - thumbnail_size: a tuple with same values than `size' (None for
                 not creating a thumbnail
+            - renditions: a dict mapping a rendition name to a tuple with
+                same values than `size'. Each rendition is saved next to the
+                image and is accessible as an attribute of the field file.
+                `thumbnail_size' is shorthand for a rendition named
+                `thumbnail'.
+            - deferred: when True, only the original is saved with the model
+                and the resizing and renditions are done afterwards by the
+                ``IMAGE_HELPER_TASK_BACKEND``.
+            - placeholder_url: the url renditions of a deferred field return
+                until they exist (defaults to the original image's url).
+            - format: the PIL format the image is saved in, eg. 'WEBP'. The
+                file extension is changed to match (None keeps the upload's).
+            - quality, optimize, progressive, lossless: passed to PIL when
+                saving, for the formats that support them.
+            - webp: when True, a WebP copy is saved next to the image and
+                each rendition, accessible as `image.webp' and
+                `image.thumbnail.webp'.
+            - content_addressed: when True, files are named after a hash of
+                the upload and the field's options. Uploading an image that
+                is already stored, with all its renditions, reuses the stored
+                files without resizing or saving anything.
+            - on_demand: when True, renditions aren't created on save but by
+                ``image_helper.views.rendition`` the first time their url is
+                requested. Can also be set per rendition.
+            - resample: a preset from ``RESAMPLE_PRESETS`` ('quality',
+                'balanced' or 'fast'), or the name or value of a PIL filter,
+                eg. 'bicubic'. 'fast' is hard to tell apart from the others
+                on small thumbnails.
+            - reducing_gap: overrides the preset's reducing_gap, None to
+                always apply the filter to the full image.
+            - delete_with_model: when True, the image and its renditions are
+                deleted once the transaction deleting the instance commits.
+            - delete_on_replace: when True, the previous image and its
+                renditions are deleted once the transaction saving a new
+                image (or clearing it) commits.
+                Images still referenced by another row are never deleted.
+                Neither option applies to ``QuerySet.update()``, which
+                doesn't send signals.
+            - metadata_field: name of a JSONField of the model the name,
+                width, height, bytes, format and sha256 hash of the image,
+                its renditions and WebP copies are recorded in when they're
+                saved. The file's and renditions' size, width and height
+                are read from it, instead of from storage or the image.
+            - max_pixels, max_bytes: the largest image the field decodes,
+                checked from its header. Default to the
+                ``IMAGE_HELPER_MAX_PIXELS`` and ``IMAGE_HELPER_MAX_BYTES``
+                settings. Larger images raise a ValidationError, or are
+                decoded at a reduced scale when
+                ``IMAGE_HELPER_OVER_BUDGET`` is 'draft'.
+            - concurrent_writes: when True, renditions are written to
+                storage on a thread pool shared by every field (sized by
+                ``IMAGE_HELPER_WRITE_WORKERS``) while the next one is
+                encoded and the image is saved, so saving waits for the
+                slowest write instead of all of them. When a write fails the
+                files already written are deleted. The storage must be
+                thread safe.
+            - naming: how uploads are named, one of
+                ``image_helper.naming.NAMING_STRATEGIES`` ('available',
+                'uuid' or 'sharded'), the dotted path of a strategy class or
+                a strategy. 'available' keeps the upload's name, checking
+                storage for one that isn't taken. 'uuid' and 'sharded' are
+                random names written without any storage check, 'sharded'
+                spreads them over prefix directories. Renditions are named
+                after the image either way. Ignored by content_addressed
+                fields.
+            - placeholder_field: name of a text column of the model a tiny
+                placeholder of the image is stored in, computed from the
+                image already decoded to resize it. Exposed as
+                `image.placeholder'.
+            - placeholder: the kind of placeholder, one of
+                ``image_helper.placeholders.PLACEHOLDERS``: 'blurhash',
+                'color' (the dominant color) or 'webp' (a 16px WebP
+                ``data:`` url).
+            - keep_metadata: when True, the EXIF of the upload (and its XMP
+                in WebPs) is saved with the image, without the orientation,
+                which is always applied, the embedded preview or maker
+                notes. Otherwise it's stripped. Either way, images with an ICC profile are
+                converted to sRGB and saved without it, when Pillow has
+                Little CMS.
+
+            Renditions given as a dict take the same format, quality,
+            optimize, progressive, lossless, webp, on_demand, resample,
+            reducing_gap and keep_metadata options, and default to the
+            field's.
 
         Example: (640, 480, True) -> Will resize image to a width of 640px and
             a height of 480px. File will be cut if necessary for forcing
             the image to have the desired size
+
+        Example: renditions={'small': (100, 100), 'retina': (800, 800)}
+            -> `image.small.url' and `image.retina.url'
+
+        Example: renditions={'small': {'size': (100, 100), 'format': 'WEBP', 'quality': 75}}
         """
+        self.encode_options = dict(
+            (key, value) for key, value in [
+                ('format', format), ('quality', quality), ('optimize', optimize),
+                ('progressive', progressive), ('lossless', lossless), ('webp', webp),
+                ('keep_metadata', keep_metadata),
+            ] if value is not None)
+        if format:
+            _check_format(format)
+        self.resize_options = {'resample': resample}
+        if reducing_gap is not None:
+            self.resize_options['reducing_gap'] = reducing_gap
+        self._get_resample(self.resize_options)
         self.size = self._get_resize_options(size)
         self.thumbnail_size = self._get_resize_options(thumbnail_size)
+        self.renditions = self._get_renditions(renditions, self.thumbnail_size, on_demand)
+        self.deferred = deferred
+        self.placeholder_url = placeholder_url
+        self.content_addressed = content_addressed
+        self.delete_with_model = delete_with_model
+        self.delete_on_replace = delete_on_replace
+        self.metadata_field = metadata_field
+        self.max_pixels = max_pixels
+        self.max_bytes = max_bytes
+        self.concurrent_writes = concurrent_writes
+        self.naming = get_naming(naming)
+        if placeholder not in PLACEHOLDERS:
+            raise ValueError("Unknown placeholder {!r}, expected one of {}.".format(
+                placeholder, ', '.join(sorted(PLACEHOLDERS))))
+        self.placeholder_field = placeholder_field
+        self.placeholder = placeholder
+        self._pending_deletes = threading.local()
 
         super(SizedImageField, self).__init__(verbose_name, name, width_field,
                                               height_field, **kwargs)
 
+    def validate(self, value, model_instance):
+        super(SizedImageField, self).validate(value, model_instance)
+        if value and not value._committed:
+            probe = self._probe(value.file)
+            if probe is not None:
+                self._check_budget(probe, value.file)
+
+    def _probe(self, file):
+        """
+        Returns the `ImageProbe` of an upload: from the image
+        ``forms.ImageField`` verified when the upload went through a form,
+        or from its header. None when it isn't an image.
+        """
+        probe = getattr(file, 'image_probe', None)
+        if probe is not None:
+            return probe
+
+        image = getattr(file, 'image', None)
+        source = None
+        if image is None:
+            source = self._get_image_source(file)
+            try:
+                image = Image.open(source)
+            except OSError:
+                return None
+            finally:
+                file.seek(0)
+
+        exif = Image.Exif()
+        if image.info.get('exif'):
+            exif.load(image.info['exif'])
+        probe = ImageProbe(image.format, image.size, image.mode, exif.get(0x0112, 1))
+        if source is not None and source is not file:
+            # Opened from the path, nothing else holds the file open.
+            image.close()
+        try:
+            file.image_probe = probe
+        except AttributeError:
+            pass
+        return probe
+
+    def _get_image_source(self, file):
+        """
+        Returns what PIL should open `file` from: the path of a
+        ``TemporaryUploadedFile`` rather than its Python file object, so PIL
+        reads it directly (and memory maps formats that allow it).
+        """
+        temporary_file_path = getattr(file, 'temporary_file_path', None)
+        if temporary_file_path is not None:
+            return temporary_file_path()
+        return file
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super(SizedImageField, self).contribute_to_class(cls, name, **kwargs)
+        if self.delete_with_model:
+            post_delete.connect(self._delete_with_instance, sender=cls)
+        if self.delete_on_replace:
+            post_save.connect(self._delete_replaced_image, sender=cls)
+        if self.metadata_field or self.placeholder_field:
+            pre_save.connect(self._commit_before_save, sender=cls)
+
     def _get_resize_options(self, dimensions):
         """
         :param dimensions:
@@ -94,12 +548,42 @@ class SizedImageField(ImageField):
                 dimensions = tuple(dimensions) + (False, )
             return dimensions
 
-    def contribute_to_class(self, cls, name):
+    def _get_renditions(self, renditions, thumbnail_size, on_demand=False):
         """
-        Makes sure thumbnail gets set when image field initialized.
+        :param renditions:
+            A dict of rendition name to a `size' tuple, or to a dict of
+            options containing at least a `size' key.
+
+        :returns:
+            An ``OrderedDict`` of rendition name to options, largest
+            rendition first so smaller ones can be downsampled from it.
         """
-        super(SizedImageField, self).contribute_to_class(cls, name)
-        signals.post_init.connect(self._set_thumbnail, sender=cls)
+        renditions = dict(renditions or {})
+        if thumbnail_size:
+            renditions.setdefault('thumbnail', thumbnail_size)
+
+        normalized = []
+        for name, options in renditions.items():
+            if hasattr(SizedImageFieldFile, name) or not name.isidentifier() or name == 'webp':
+                raise ValueError(
+                    "'{}' can't be used as a rendition name.".format(name))
+            if not isinstance(options, dict):
+                options = {'size': options}
+            options = dict(self.encode_options, **dict(
+                self.resize_options, **dict(options, size=self._get_resize_options(options.get('size')))))
+            options.setdefault('on_demand', on_demand)
+            if not options['size']:
+                raise ValueError(
+                    "Rendition '{}' needs a size.".format(name))
+            if options.get('format'):
+                _check_format(options['format'])
+            if options.get('webp'):
+                _check_format('WEBP')
+            self._get_resample(options)
+            normalized.append((name, options))
+
+        normalized.sort(key=lambda item: item[1]['size'][0] * item[1]['size'][1], reverse=True)
+        return OrderedDict(normalized)
 
     def pre_save(self, model_instance, add):
         """
@@ -107,69 +591,977 @@ class SizedImageField(ImageField):
         """
         file = getattr(model_instance, self.attname)
         if file and not file._committed:
-            file.name = self._clean_file_name(model_instance, file.name)
-            file.file = self._resize_image(model_instance, file)
-            file.save(file.name, file, save=False)
+            self._commit_file(model_instance, file)
         return file
 
+    def _commit_before_save(self, instance, raw=False, update_fields=None, **kwargs):
+        """
+        Commits the upload before Django reads the values of the model's
+        fields, which it does in their declaration order, so the
+        `metadata_field` and `placeholder_field` filled here are saved even
+        when they're declared before the image field.
+        """
+        if raw or (update_fields is not None and self.name not in update_fields):
+            return
+        file = getattr(instance, self.attname)
+        if not file or file._committed:
+            return
+        if self.deferred:
+            # Deferred processing only queues once the transaction commits.
+            self._set_image_metadata(instance, None)
+            self._set_placeholder(instance, None)
+        else:
+            self._commit_file(instance, file)
+
+    def process_batch(self, instances, workers=None):
+        """
+        Resizes the uploads of many instances and renders their renditions
+        on a process pool, then saves the files, so bulk imports use every
+        core. The instances are left with a committed image, ready to be
+        saved or passed to ``bulk_create``. Instances without a new upload
+        are skipped, the uploads of deferred fields are only saved.
+
+        Every upload is held in memory until it's processed, pass large
+        imports in chunks.
+
+        Uploads given the same name as another one of the batch, such as
+        identical uploads to a content addressed field, are saved one at a
+        time once the others are, as ``save()`` would.
+
+        An image that fails doesn't stop the others. Its file is left
+        uncommitted, so it's processed again if the instance is saved.
+
+        :param workers:
+            Number of worker processes, None for one per core. 0 does the
+            work in this process.
+
+        :returns:
+            A list of (instance, error message) of the images that failed.
+        """
+        failed = []
+        pending = []
+        claimed = set()
+        collisions = []
+        for instance in instances:
+            file = getattr(instance, self.attname)
+            if not file or file._committed:
+                continue
+            try:
+                if not self._name_file(instance, file):
+                    continue
+                full_image_name = self.generate_filename(instance, file.name)
+                if full_image_name in claimed:
+                    collisions.append((instance, file))
+                elif self.deferred:
+                    self._save_deferred(instance, file)
+                else:
+                    claimed.add(full_image_name)
+                    file.seek(0)
+                    pending.append((instance, file, full_image_name, file.read()))
+            except Exception as e:
+                failed.append((instance, "{}: {}".format(e.__class__.__name__, e)))
+
+        render = partial(render_upload, self.model._meta.label, self.name)
+        names = [full_image_name for instance, file, full_image_name, content in pending]
+        contents = [content for instance, file, full_image_name, content in pending]
+        executor = None
+        if workers != 0 and pending:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+        try:
+            results = executor.map(render, names, contents) if executor else map(render, names, contents)
+            for (instance, file, full_image_name, content), (name, image, renditions, error) in zip(pending, results):
+                if error:
+                    failed.append((instance, error))
+                    continue
+                error = self._try_commit(file, partial(
+                    self._save_processed, instance, file,
+                    partial(self._save_rendered, full_image_name, image, renditions)))
+                if error:
+                    failed.append((instance, error))
+        finally:
+            if executor:
+                executor.shutdown()
+
+        for instance, file in collisions:
+            error = self._try_commit(file, partial(self._commit_file, instance, file))
+            if error:
+                failed.append((instance, error))
+        return failed
+
+    def _try_commit(self, file, commit):
+        """
+        Calls `commit`, restoring the upload of `file` when it fails.
+
+        :returns:
+            The error message, None when it succeeded.
+        """
+        upload = file.file
+        try:
+            commit()
+        except Exception as e:
+            file.file = upload
+            return "{}: {}".format(e.__class__.__name__, e)
+
+    def _commit_file(self, model_instance, file):
+        if not self._name_file(model_instance, file):
+            return
+        if self.deferred:
+            self._save_deferred(model_instance, file)
+        else:
+            self._save_processed(model_instance, file, partial(self._resize_image, model_instance, file))
+
+    def _name_file(self, model_instance, file):
+        """
+        Names `file` as it will be stored. Returns False when it's a content
+        addressed upload that's already stored, and there's nothing to save.
+        """
+        if self.content_addressed:
+            file.name = self._get_content_file_name(file)
+            return not self._reuse_stored_file(model_instance, file)
+        file.name = self._clean_file_name(model_instance, file.name)
+        return True
+
+    def _save_deferred(self, model_instance, file):
+        """
+        Saves the original of a deferred field and queues its processing
+        once the transaction commits.
+        """
+        self._set_image_metadata(model_instance, None)
+        self._set_placeholder(model_instance, None)
+        self._save_field_file(file)
+        for rendition in self._get_saved_renditions():
+            invalidate_file_metadata(self.storage, self._get_rendition_filename(file.name, rendition))
+        transaction.on_commit(partial(self._defer_processing, file.name))
+
+    def _save_processed(self, model_instance, file, process):
+        """
+        Saves `file` as the resized image `process(writes)` returns, once
+        the renditions it started writing are saved. Deletes what was saved
+        when any of it fails.
+        """
+        writes = []
+        try:
+            file.file = process(writes)
+            # Set first, so the dimension fields are updated from it on save.
+            metadata = getattr(file.file, 'image_metadata', None)
+            self._set_image_metadata(model_instance, metadata)
+            self._set_placeholder(model_instance, getattr(file.file, 'placeholder', None))
+            self._save_field_file(file)
+        except Exception:
+            self._finish_writes(writes, failed=True)
+            raise
+        try:
+            self._finish_writes(writes)
+        except Exception:
+            self._delete_files([file.name])
+            raise
+        if metadata and metadata['name'] != file.name:
+            metadata['name'] = file.name
+
+    def _save_rendered(self, full_image_name, image, renditions, writes):
+        """
+        Starts writing the renditions ``render_upload`` rendered, and returns
+        the resized image ready to be saved, like `_process`.
+        """
+        content, metadata, placeholder = image
+        files = {}
+        for rendition_filename, rendition_content, rendition_metadata in renditions:
+            self._start_write(writes, rendition_filename, ContentFile(rendition_content))
+            files[rendition_filename] = rendition_metadata
+        encoded = ContentFile(content, name=os.path.basename(full_image_name))
+        encoded.placeholder = placeholder
+        if self.metadata_field:
+            files[full_image_name] = metadata
+            encoded.image_metadata = self._build_image_metadata(full_image_name, files)
+        return encoded
+
+    def _save_field_file(self, file):
+        with self._measure('storage_save', name=file.name) as event:
+            event['bytes_written'] = getattr(file.file, 'size', None)
+            if self._has_unique_names():
+                # What FieldFile.save does, without looking for an available name.
+                file.name = self.storage._save(self.generate_filename(file.instance, file.name), file)
+                setattr(file.instance, self.attname, file.name)
+                file._committed = True
+            else:
+                file.save(file.name, file, save=False)
+
+    def _save_file(self, name, content, overwrite=False):
+        """
+        Saves a file the field created to storage and forgets what was
+        cached about it.
+
+        :param overwrite:
+            When True, a file already stored under `name` is replaced,
+            rather than the storage saving this one under another name.
+        """
+        with self._measure('storage_save', name=name) as event:
+            event['bytes_written'] = getattr(content, 'size', None)
+            if overwrite:
+                self.storage.delete(name)
+                saved_name = self.storage._save(name, content)
+            elif self._has_unique_names():
+                saved_name = self.storage._save(name, content)
+            else:
+                saved_name = self.storage.save(name, content)
+        invalidate_file_metadata(self.storage, name)
+        return saved_name
+
+    def _replace_file(self, name, content):
+        """
+        Replaces the stored file `name` with `content`. It's written under a
+        temporary name first and swapped in once it's stored, so `name` is
+        left as it was when the write fails.
+        """
+        root, ext = os.path.splitext(name)
+        temp_name = self._save_file(root + '.replacing' + ext, content)
+        try:
+            try:
+                path = self.storage.path(name)
+            except NotImplementedError:
+                path = None
+            if path:
+                os.replace(self.storage.path(temp_name), path)
+                temp_name = None
+            else:
+                # Remote storages overwrite on _save, rather than looking for
+                # an available name.
+                with self.storage.open(temp_name) as temp:
+                    saved_name = self.storage._save(name, temp)
+                if saved_name != name:
+                    self.storage.delete(saved_name)
+                    logger.warning("Couldn't overwrite %s, it was left as it was.", name)
+        finally:
+            if temp_name:
+                self.storage.delete(temp_name)
+        invalidate_file_metadata(self.storage, name)
+
+    def _start_write(self, writes, name, content):
+        """
+        Saves a file the field created, on the shared write pool when the
+        field has `concurrent_writes`.
+
+        :param writes:
+            A list the write is added to, as a ``Future`` of the saved name,
+            for `_finish_writes`. None to save right away.
+        """
+        if writes is None:
+            self._save_file(name, content)
+        elif self.concurrent_writes:
+            writes.append(get_write_executor().submit(self._save_file, name, content))
+        else:
+            write = Future()
+            write.set_result(self._save_file(name, content))
+            writes.append(write)
+
+    def _finish_writes(self, writes, failed=False):
+        """
+        Waits for the writes `_start_write` started. When one of them failed,
+        or the caller did (`failed`), deletes the files the others saved.
+        Raises the error of the first write that failed, unless the caller
+        failed.
+        """
+        wait(writes)
+        errors = [write.exception() for write in writes if write.exception() is not None]
+        if errors or failed:
+            self._delete_files([write.result() for write in writes if write.exception() is None])
+        if errors and not failed:
+            raise errors[0]
+
+    def _measure(self, stage, name=None, input_size=None):
+        """
+        Times a stage of processing an image, see ``image_helper.metrics``.
+        """
+        return measure_stage(self, stage, name, input_size)
+
+    def _get_stored_name_key(self):
+        return '_{}_stored_name'.format(self.attname)
+
+    def _delete_with_instance(self, instance, using=None, **kwargs):
+        name = getattr(instance, self.attname).name
+        if name:
+            self._schedule_delete(name, using)
+
+    def _delete_replaced_image(self, instance, using=None, **kwargs):
+        name = getattr(instance, self.attname).name
+        stored_name = instance.__dict__.get(self._get_stored_name_key())
+        if stored_name and stored_name != name:
+            self._schedule_delete(stored_name, using)
+        instance.__dict__[self._get_stored_name_key()] = name
+
+    def _schedule_delete(self, name, using=None):
+        """
+        Deletes a stored image and its renditions once the transaction
+        commits, in batches with every other image the field deletes in it.
+        """
+        connection = transaction.get_connection(using)
+        batch = getattr(self._pending_deletes, connection.alias, None)
+        if batch is not None and any(entry[1] is batch for entry in connection.run_on_commit):
+            batch.names.add(name)
+            return
+        batch = _DeleteBatch(self)
+        batch.names.add(name)
+        setattr(self._pending_deletes, connection.alias, batch)
+        transaction.on_commit(batch, using)
+
+    def _delete_images(self, names):
+        """
+        Deletes stored images and their renditions, except the images a row
+        still references, eg. a content addressed image uploaded twice.
+        """
+        referenced = set(self.model._default_manager.filter(**{self.attname + '__in': names}).values_list(
+            self.attname, flat=True))
+        self._delete_files([filename for name in names if name not in referenced
+                            for filename in self._get_stored_filenames(name)])
+
+    def _delete_files(self, filenames):
+        """
+        Deletes files from storage, with the storage's ``delete_many(names)``
+        when it has one.
+        """
+        delete_many = getattr(self.storage, 'delete_many', None)
+        try:
+            if delete_many is not None:
+                delete_many(filenames)
+            else:
+                for filename in filenames:
+                    self.storage.delete(filename)
+        except Exception:
+            logger.exception("Failed to delete %s", ', '.join(filenames))
+        for filename in filenames:
+            invalidate_file_metadata(self.storage, filename)
+
+    def _get_stored_filenames(self, name):
+        """
+        Returns the names of every file stored for the image `name`: the
+        image, its renditions and their WebP copies.
+        """
+        filenames = [name]
+        if self.encode_options.get('webp'):
+            filenames.append(_get_format_filename(name, 'WEBP'))
+        for rendition, options in self.renditions.items():
+            rendition_filename = self._get_rendition_filename(name, rendition)
+            filenames.append(rendition_filename)
+            if options.get('webp'):
+                filenames.append(_get_format_filename(rendition_filename, 'WEBP'))
+        return list(OrderedDict.fromkeys(filenames))
+
+    def _defer_processing(self, name):
+        get_backend().submit(process_image, self.model._meta.label, self.name, name)
+
+    def _process_stored_image(self, name):
+        """
+        Does the work `pre_save` skips for deferred fields: creates the
+        renditions of the stored image, and replaces it with its resized
+        version when the field has a `size` or output options.
+        """
+        writes = []
+        try:
+            with self.storage.open(name) as stored:
+                resized = self._process(stored, name, writes)
+        except Exception:
+            self._finish_writes(writes, failed=True)
+            raise
+        self._finish_writes(writes)
+
+        if self.size or self.encode_options:
+            self._replace_file(name, resized)
+        elif self.metadata_field:
+            resized.image_metadata.update(self._describe_stored_file(name))
+
+        updates = {}
+        if self.metadata_field:
+            updates[self.metadata_field] = resized.image_metadata
+        if self.placeholder_field:
+            updates[self.placeholder_field] = resized.placeholder
+        if updates:
+            self.model._default_manager.filter(**{self.attname: name}).update(**updates)
+
+    def _get_image_metadata(self, image_field):
+        """
+        Returns the recorded metadata of `image_field`, when it's about the
+        file the field holds now.
+        """
+        if not self.metadata_field:
+            return None
+        metadata = getattr(image_field.instance, self.metadata_field, None)
+        if metadata and metadata.get('name') == image_field.name:
+            return metadata
+        return None
+
+    def _set_image_metadata(self, model_instance, metadata):
+        if self.metadata_field:
+            setattr(model_instance, self.metadata_field, metadata)
+
+    def _set_placeholder(self, model_instance, placeholder):
+        if self.placeholder_field:
+            setattr(model_instance, self.placeholder_field, placeholder)
+
+    def _render_placeholder(self, image, full_image_name):
+        """
+        Returns the placeholder of the decoded `image`, None when the field
+        doesn't store one.
+        """
+        if not self.placeholder_field:
+            return None
+        with self._measure('placeholder', name=full_image_name, input_size=image.size):
+            return PLACEHOLDERS[self.placeholder](image)
+
+    def _build_image_metadata(self, name, files):
+        """
+        :param files:
+            A dict of file name to the metadata of each file saved for the
+            image `name`.
+
+        :returns:
+            The metadata of the image, with the one of its WebP copy under
+            'webp' and the ones of its renditions under 'renditions'.
+        """
+        metadata = dict(files[name], name=name, renditions={})
+        self._add_rendition_metadata(metadata, name, files)
+        return metadata
+
+    def _describe_rendition(self, filename, files):
+        """
+        Returns the metadata of the rendition `filename` in `files`, with
+        the one of its WebP copy under 'webp'.
+        """
+        metadata = dict(files[filename], name=filename)
+        webp_filename = _get_format_filename(filename, 'WEBP')
+        if webp_filename != filename and webp_filename in files:
+            metadata['webp'] = dict(files[webp_filename], name=webp_filename)
+        return metadata
+
+    def _add_rendition_metadata(self, metadata, name, files):
+        """
+        Records in the `metadata` of the image `name` the ones of its WebP
+        copy and of its renditions found in `files`.
+        """
+        webp_filename = _get_format_filename(name, 'WEBP')
+        if webp_filename != name and webp_filename in files:
+            metadata['webp'] = dict(files[webp_filename], name=webp_filename)
+        for rendition in self.renditions:
+            rendition_filename = self._get_rendition_filename(name, rendition)
+            if rendition_filename in files:
+                metadata.setdefault('renditions', {})[rendition] = self._describe_rendition(rendition_filename, files)
+
+    def _update_rendition_metadata(self, name, files):
+        """
+        Records the metadata of the renditions of the stored image `name`
+        just saved in the `metadata_field` of the instances storing it.
+
+        :param files:
+            A dict of file name to the metadata of each rendition saved.
+        """
+        if not self.metadata_field:
+            return
+        manager = self.model._default_manager
+        for pk, metadata in manager.filter(**{self.attname: name}).values_list('pk', self.metadata_field):
+            if metadata and metadata.get('name') == name:
+                self._add_rendition_metadata(metadata, name, files)
+                manager.filter(pk=pk).update(**{self.metadata_field: metadata})
+
+    def _describe_stored_file(self, name):
+        """
+        Returns the metadata of a stored file, reading it once.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with self.storage.open(name) as stored:
+            image = Image.open(stored)
+            metadata = {'width': image.width, 'height': image.height, 'format': image.format}
+            stored.seek(0)
+            for chunk in stored.chunks():
+                digest.update(chunk)
+                size += len(chunk)
+        metadata.update(bytes=size, hash=digest.hexdigest())
+        return metadata
+
     def _clean_file_name(self, model_instance, filename):
         """
         We need to make sure we know the full file name before we save the thumbnail so
         we can be sure the name doesn't change on save.
 
-        This method gets the available filename and returns just the file part.
+        This method gets the name from the naming strategy, relative to upload_to.
+        """
+        filename = _get_format_filename(filename, self.encode_options.get('format'))
+        return self.naming.get_name(self, model_instance, filename)
+
+    def _has_unique_names(self):
+        """
+        Whether the names of the files the field saves are never taken, so
+        they're saved without asking the storage for an available name.
+        """
+        return self.naming.unique and not self.content_addressed
+
+    def _get_spec(self):
+        """
+        Returns a description of the options that change how images are
+        resized and saved.
+        """
+        return repr((
+            self.size,
+            sorted((rendition, sorted(options.items())) for rendition, options in self.renditions.items()),
+            sorted(self.encode_options.items()),
+            sorted(self.resize_options.items()),
+        ))
+
+    def _get_dimensions(self, image_field, rendition=None):
+        """
+        Returns the width and height `image_field`, or one of its
+        renditions, is stored at without reading it: from the metadata_field,
+        scaled from the width_field and height_field when the field has
+        them, or the size of a rendition forced to it. None when they aren't
+        known, the bounding box an image was shrunk to isn't its size.
+        """
+        metadata = self._get_image_metadata(image_field)
+        if metadata:
+            metadata = metadata['renditions'].get(rendition) if rendition else metadata
+            if metadata:
+                return metadata['width'], metadata['height']
+
+        width = height = None
+        if self.width_field and self.height_field:
+            width = getattr(image_field.instance, self.width_field)
+            height = getattr(image_field.instance, self.height_field)
+
+        dimensions = self.renditions[rendition]['size'] if rendition else self.size
+        if not dimensions:
+            return (width, height) if width and height else None
+        box_width, box_height, force_size = dimensions
+        if force_size:
+            return box_width, box_height
+        if not (width and height):
+            return None
+        scale = min(1.0, float(box_width) / width, float(box_height) / height)
+        return max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+
+    def _get_file_dimensions(self, image_field, rendition=None):
+        """
+        Returns the width and height of `image_field`, or of one of its
+        renditions: the ones `_get_dimensions` knows, otherwise read from
+        the stored file and cached. None when they aren't known and the file
+        isn't stored yet.
+        """
+        dimensions = self._get_dimensions(image_field, rendition)
+        if dimensions:
+            return dimensions
+        name = self._get_rendition_filename(image_field.name, rendition) if rendition else image_field.name
+        try:
+            dimensions = get_file_metadata(self.storage, name, 'dimensions', partial(self._read_dimensions, name))
+        except (IOError, OSError):
+            return None
+        return dimensions if all(dimensions) else None
+
+    def _read_dimensions(self, name):
+        with self.storage.open(name) as file:
+            return get_image_dimensions(file)
+
+    def _get_content_file_name(self, file):
+        """
+        Returns a file name made of the hash of the file's content and of
+        the options that change how it's resized and saved, so the same
+        upload to the same field always gets the same name.
         """
-        available_name = self.storage.get_available_name(
-            self.generate_filename(model_instance, filename))
-        return os.path.basename(available_name)
+        digest = hashlib.sha256(self._get_spec().encode('utf-8'))
+        for chunk in file.chunks():
+            digest.update(chunk)
+        file.seek(0)
+
+        extension = os.path.splitext(file.name)[1].lower()
+        return _get_format_filename(digest.hexdigest()[:32] + extension, self.encode_options.get('format'))
 
-    def _create_thumbnail(self, model_instance, thumbnail, image_name):
+    def _reuse_stored_file(self, model_instance, file):
         """
-        Resizes and saves the thumbnail image
+        Points `file` to the stored copy of a content addressed upload when
+        it and all of its renditions are already stored.
+
+        Otherwise removes what's left of a partial copy so it can be saved
+        again under the same names, and returns False.
         """
-        thumbnail = self._do_resize(thumbnail, self.thumbnail_size)
-        full_image_name = self.generate_filename(model_instance, image_name)
-        thumbnail_filename = _get_thumbnail_filename(full_image_name)
-        thumb = self._get_simple_uploaded_file(thumbnail, thumbnail_filename)
-        self.storage.save(thumbnail_filename, thumb)
+        full_image_name = self.generate_filename(model_instance, file.name)
+        names = [full_image_name] + [self._get_rendition_filename(full_image_name, rendition)
+                                     for rendition in self._get_saved_renditions()]
+        existing = [name for name in names if self.storage.exists(name)]
+        if len(existing) == len(names):
+            file.name = full_image_name
+            file._committed = True
+            if self.metadata_field:
+                self._set_image_metadata(model_instance, self.model._default_manager.filter(
+                    **{self.attname: full_image_name, self.metadata_field + '__isnull': False}
+                ).values_list(self.metadata_field, flat=True).first())
+            if self.placeholder_field:
+                self._set_placeholder(model_instance, self.model._default_manager.filter(
+                    **{self.attname: full_image_name, self.placeholder_field + '__isnull': False}
+                ).values_list(self.placeholder_field, flat=True).first())
+            return True
+
+        for name in existing:
+            self.storage.delete(name)
+        return False
+
+    def _get_rendition_filename(self, filename, rendition):
+        """
+        Returns the file name a rendition of `filename' is stored under.
+        """
+        thumbnail_filename = _get_thumbnail_filename(filename, append_text="-" + rendition)
+        return _get_format_filename(thumbnail_filename, self.renditions[rendition].get('format'))
+
+    def _get_saved_renditions(self):
+        """
+        Returns the names of the renditions created when the image is saved,
+        as opposed to on demand.
+        """
+        return [rendition for rendition, options in self.renditions.items() if not options['on_demand']]
+
+    def _create_renditions(self, image, full_image_name, writes=None):
+        """
+        Resizes and encodes every rendition from the one decoded image. With
+        `concurrent_writes` they're saved on the shared write pool as they
+        come, otherwise they're left for the caller to save once it gave its
+        resize slot back.
+
+        :param writes:
+            See `_start_write`.
 
-    def _resize_image(self, model_instance, image_field):
+        :returns:
+            A dict of the name of each file to its metadata, and a list of
+            the (name, encoded file) the caller saves with `_start_write`.
+        """
+        files = {}
+        pending = []
+        for rendition_filename, rendition_file in self._render_renditions(image, full_image_name):
+            if self.concurrent_writes and writes is not None:
+                self._start_write(writes, rendition_filename, rendition_file)
+            else:
+                pending.append((rendition_filename, rendition_file))
+            files[rendition_filename] = rendition_file.metadata
+        return files, pending
+
+    def _render_renditions(self, image, full_image_name):
+        """
+        Yields the file name and encoded file of every rendition, and of the
+        WebP copies of `image` and the renditions when they're wanted.
+
+        Renditions are ordered largest first, so each is downsampled from
+        the previous rendition when that's still big enough, rather than
+        from the full image.
+        """
+        if self.encode_options.get('webp'):
+            for encoded in self._render_webp(image, full_image_name, self.encode_options):
+                yield encoded
+
+        source = image
+        for rendition in self._get_saved_renditions():
+            options = self.renditions[rendition]
+            if not self._can_resize_from(source, image, options['size']):
+                source = image
+
+            resized, encoded_files = self._render_rendition(source, full_image_name, rendition)
+            for encoded in encoded_files:
+                yield encoded
+            if not options['size'][2]:
+                source = resized
+
+    def _render_rendition(self, image, full_image_name, rendition):
+        """
+        :returns:
+            The resized image and a list of the file name and encoded file
+            of the rendition, and of its WebP copy when it's wanted.
+        """
+        options = self.renditions[rendition]
+        rendition_filename = self._get_rendition_filename(full_image_name, rendition)
+        with self._measure('rendition', name=rendition_filename, input_size=image.size) as event:
+            resized = self._do_resize(image.copy(), options['size'], options)
+            event['output_size'] = resized.size
+        encoded_files = [(rendition_filename, self._get_simple_uploaded_file(resized, rendition_filename, options))]
+        if options.get('webp'):
+            encoded_files.extend(self._render_webp(resized, rendition_filename, options))
+        return resized, encoded_files
+
+    def _create_rendition(self, name, rendition):
+        """
+        Creates one rendition of the stored image `name`. Used for the
+        renditions generated on demand.
+        """
+        with self.storage.open(name) as stored, resize_slot():
+            resized, encoded_files = self._render_rendition(self._open_image(stored), name, rendition)
+        for rendition_filename, rendition_file in encoded_files:
+            # Another process may have created it meanwhile, without a shared lock.
+            self._save_file(rendition_filename, rendition_file, overwrite=True)
+
+        self._update_rendition_metadata(name, dict(
+            (rendition_filename, rendition_file.metadata) for rendition_filename, rendition_file in encoded_files))
+
+    def _render_webp(self, image, filename, options):
+        """
+        Yields the WebP copy of an image saved as `filename`, unless it
+        already is a WebP.
+        """
+        webp_filename = _get_format_filename(filename, 'WEBP')
+        if webp_filename != filename:
+            yield webp_filename, self._get_simple_uploaded_file(image, webp_filename, options)
+
+    def _can_resize_from(self, source, image, dimensions):
+        """
+        A rendition can be downsampled from a previous one as long as that
+        one is at least as big as the rendition would be if it were made from
+        the full image. Forced sizes change the aspect ratio, so they are
+        always made from the full image.
+        """
+        width, height, force_size = dimensions
+        if source is image:
+            return True
+        if force_size:
+            return False
+        scale = min(float(width) / image.width, float(height) / image.height, 1)
+        return source.width >= round(image.width * scale) and source.height >= round(image.height * scale)
+
+    def _resize_image(self, model_instance, image_field, writes=None):
         """"""
-        image_name = image_field.name
+        full_image_name = self.generate_filename(model_instance, image_field.name)
+        return self._process(image_field.file, full_image_name, writes)
 
-        image = Image.open(image_field.file)
-        if image.mode not in ('L', 'RGB'):
-            image = image.convert('RGB')
+    def _process(self, file, full_image_name, writes=None):
+        """
+        Decodes `file`, saves its renditions next to `full_image_name` and
+        returns the resized image ready to be saved.
+
+        :param writes:
+            See `_start_write`.
+        """
+        with resize_slot():
+            image = self._open_resized_image(file, full_image_name)
+            files, pending = self._create_renditions(image, full_image_name, writes)
 
+            encoded = self._get_simple_uploaded_file(image, os.path.basename(full_image_name), self.encode_options)
+            encoded.placeholder = self._render_placeholder(image, full_image_name)
+        for rendition_filename, rendition_file in pending:
+            self._start_write(writes, rendition_filename, rendition_file)
+        if self.metadata_field:
+            files[full_image_name] = encoded.metadata
+            encoded.image_metadata = self._build_image_metadata(full_image_name, files)
+        return encoded
+
+    def _open_resized_image(self, file, full_image_name):
+        """
+        Decodes `file` and resizes it to the field's `size`. Images with an
+        ICC profile are converted to sRGB once resized, on fewer pixels.
+        """
+        image = self._open_image(file, convert_profile=False)
         if self.size:
-            image = self._do_resize(image, self.size)
+            with self._measure('resize', name=full_image_name, input_size=image.size) as event:
+                image = self._do_resize(image, self.size, self.resize_options)
+                event['output_size'] = image.size
+        return self._convert_mode(image)
+
+    def _open_image(self, file, convert_profile=True):
+        """
+        Opens and decodes `file` with PIL, in a mode every output format can
+        save.
+
+        :param convert_profile:
+            False to leave an image with an ICC profile in its colorspace,
+            for the caller to pass to `_convert_mode` once resized.
+        """
+        probe = getattr(file, 'image_probe', None)
+        with self._measure('open', name=getattr(file, 'name', None)) as event:
+            image = Image.open(self._get_image_source(file))
+            event['input_size'] = image.size
+            max_pixels = self._check_budget(probe or image, file)
+            orientation = probe.orientation if probe is not None else image.getexif().get(0x0112, 1)
+            image = self._draft(image, max_pixels, orientation)
+            if max_pixels and image.width * image.height > max_pixels:
+                raise self._get_budget_error(image, max_pixels)
+            image.load()
+            event['output_size'] = image.size
+
+        if orientation not in (None, 1):
+            with self._measure('orient', input_size=image.size) as event:
+                image = ImageOps.exif_transpose(image)
+                event['output_size'] = image.size
+
+        if not convert_profile and self._has_convertible_profile(image):
+            return image
+        return self._convert_mode(image)
 
-        if self.thumbnail_size:
-            self._create_thumbnail(model_instance, image.copy(), image_name)
+    def _has_convertible_profile(self, image):
+        return bool(image.info.get('icc_profile')) and image.mode in ('RGB', 'CMYK') and ImageCms is not None
 
-        return self._get_simple_uploaded_file(image, image_name)
+    def _convert_mode(self, image):
+        """
+        Converts an image to sRGB when it has an ICC profile, and to a mode
+        every output format can save.
+        """
+        if self._has_convertible_profile(image):
+            with self._measure('convert', input_size=image.size) as event:
+                image = self._convert_to_srgb(image)
+                event['output_size'] = image.size
+
+        if image.mode not in ('L', 'RGB'):
+            with self._measure('convert', input_size=image.size) as event:
+                image = image.convert('RGB')
+                event['output_size'] = image.size
+        return image
+
+    def _convert_to_srgb(self, image):
+        """
+        Converts an image with an ICC profile to sRGB, so it can be saved
+        without the profile. Returns it untouched, profile included, when
+        the profile can't be read.
+        """
+        try:
+            profile = ImageCms.ImageCmsProfile(BytesIO(image.info['icc_profile']))
+            converted = ImageCms.profileToProfile(image, profile, ImageCms.createProfile('sRGB'), outputMode='RGB')
+        except (OSError, ImageCms.PyCMSError):
+            logger.warning("Couldn't convert the ICC profile of an image to sRGB.", exc_info=True)
+            return image
+        converted.info = dict((key, value) for key, value in image.info.items() if key != 'icc_profile')
+        return converted
+
+    def _draft(self, image, max_pixels=None, orientation=None):
+        """
+        Configures the decoder to load a JPEG at the smallest power-of-two
+        scale (1/2, 1/4 or 1/8) that is still at least as large as ``size``,
+        so a large upload is never fully decoded just to be shrunk.
+
+        Other formats don't support DCT scaling and are returned untouched.
+        Disable with the ``IMAGE_HELPER_DRAFT_DECODE`` setting.
+
+        :param max_pixels:
+            When given, the scale is also small enough for the decoded
+            image to fit in that many pixels, if PIL can reduce it that much.
+
+        :param orientation:
+            The EXIF orientation the image will be turned to once decoded.
+        """
+        if image.format != 'JPEG':
+            return image
+        requested = None
+        if self.size and get_setting('DRAFT_DECODE'):
+            requested = self.size[:2]
+            if orientation in TRANSPOSED_ORIENTATIONS:
+                requested = requested[::-1]
+        if max_pixels:
+            budget_size = get_draft_size(image, max_pixels)
+            requested = budget_size if requested is None else tuple(map(min, requested, budget_size))
+        if requested:
+            image.draft(image.mode, requested)
+        return image
+
+    def _check_budget(self, image, file):
+        """
+        Checks an opened image against the field's budget before it's
+        decoded.
+
+        :returns:
+            The pixel budget to draft decode the image within, when it's over
+            it and ``IMAGE_HELPER_OVER_BUDGET`` is 'draft'.
+
+        :raises ValidationError:
+            When the image is over budget.
+        """
+        max_bytes = self.max_bytes or get_setting('MAX_BYTES')
+        size = getattr(file, 'size', None)
+        if max_bytes and size and size > max_bytes:
+            raise ValidationError(
+                "The image is %(size)s bytes, larger than the %(max_bytes)s bytes allowed.",
+                code='image_too_large', params={'size': size, 'max_bytes': max_bytes})
 
-    def _do_resize(self, img, dimensions):
+        max_pixels = self.max_pixels or get_setting('MAX_PIXELS')
+        if max_pixels and image.width * image.height > max_pixels:
+            if get_setting('OVER_BUDGET') == 'draft' and image.format == 'JPEG':
+                return max_pixels
+            raise self._get_budget_error(image, max_pixels)
+        return None
+
+    def _get_budget_error(self, image, max_pixels):
+        return ValidationError(
+            "The image is %(width)sx%(height)s pixels, larger than the %(max_pixels)s pixels allowed.",
+            code='image_too_large', params={'width': image.width, 'height': image.height, 'max_pixels': max_pixels})
+
+    def _do_resize(self, img, dimensions, options=None):
+        """
+        Shrinks `img` to fit in `dimensions`, or when forcing the size,
+        crops it to their aspect ratio and resizes it to them exactly.
+
+        :param options:
+            The field's or rendition's options, for `resample` and
+            `reducing_gap`.
+        """
         width, height, force_size = dimensions
+        resample, reducing_gap = self._get_resample(options or self.resize_options)
         if force_size:
-            img.resize((width, height), Image.ANTIALIAS)
-        else:
-            img.thumbnail((width, height), Image.ANTIALIAS)
+            return img.resize((width, height), resample, box=self._get_crop_box(img, width, height),
+                              reducing_gap=reducing_gap)
+        img.thumbnail((width, height), resample, reducing_gap=reducing_gap)
         return img
 
-    def _set_thumbnail(self, instance=None, **kwargs):
+    def _get_resample(self, options):
         """
-        Sets a `thumbnail` attribute on the image field class.
+        :returns:
+            The PIL filter and reducing_gap from the `resample` and
+            `reducing_gap` options.
+
+        :raises ValueError:
+            When `resample` is neither a preset nor a Pillow filter.
+        """
+        resample = options.get('resample') or 'balanced'
+        reducing_gap = None
+        if resample in RESAMPLE_PRESETS:
+            resample, reducing_gap = RESAMPLE_PRESETS[resample]
+        elif isinstance(resample, str) and resample.lower() in RESAMPLE_FILTERS:
+            resample = RESAMPLE_FILTERS[resample.lower()]
+        elif resample not in RESAMPLE_FILTERS.values():
+            raise ValueError("Unknown resample {!r}, expected one of {}.".format(
+                resample, ', '.join(sorted(RESAMPLE_PRESETS) + sorted(RESAMPLE_FILTERS))))
+        return resample, options.get('reducing_gap', reducing_gap)
+
+    def _get_crop_box(self, img, width, height):
+        """
+        Returns the centered region of `img` with the aspect ratio of
+        `width` by `height`.
+        """
+        target_ratio = float(width) / height
+        if float(img.width) / img.height > target_ratio:
+            crop_width = img.height * target_ratio
+            return ((img.width - crop_width) / 2, 0, (img.width + crop_width) / 2, img.height)
+        crop_height = img.width / target_ratio
+        return (0, (img.height - crop_height) / 2, img.width, (img.height + crop_height) / 2)
+
+    def _get_rendition_file(self, image_field, rendition):
+        """
+        Returns the `ThumbnailField` of a rendition of `image_field`, or of
+        its WebP copy when `rendition` is 'webp'.
         On thumbnail you can access name, url, path attributes
         """
-        image_field = getattr(instance, self.name)
-        if image_field:
-            thumbnail_filename = _get_thumbnail_filename(image_field.name)
+        fallback_name = image_field.name if self.deferred else None
+        metadata = self._get_image_metadata(image_field) or {}
+        if rendition == 'webp':
+            webp_filename = _get_format_filename(image_field.name, 'WEBP')
+            return ThumbnailField(webp_filename, self.storage, fallback_name, self.placeholder_url,
+                                  metadata=metadata.get('webp'))
+
+        generate_url = None
+        if self.renditions[rendition]['on_demand']:
+            generate_url = reverse('image_helper:rendition', kwargs={
+                'model': self.model._meta.label_lower,
+                'field_name': self.name,
+                'rendition': rendition,
+                'name': image_field.name,
+            })
 
-            thumbnail_field = ThumbnailField(thumbnail_filename, self.storage)
-            setattr(image_field, 'thumbnail', thumbnail_field)
+        thumbnail_filename = self._get_rendition_filename(image_field.name, rendition)
+        metadata = metadata.get('renditions', {}).get(rendition) or {}
+        thumbnail = ThumbnailField(thumbnail_filename, self.storage, fallback_name, self.placeholder_url, generate_url,
+                                   metadata or None)
+        if self.renditions[rendition].get('webp'):
+            thumbnail.webp = ThumbnailField(_get_format_filename(thumbnail_filename, 'WEBP'), self.storage,
+                                            fallback_name, self.placeholder_url,
+                                            generate_url and generate_url + '?webp=1', metadata.get('webp'))
+        return thumbnail
 
-    def _get_simple_uploaded_file(self, image, file_name):
+    def _get_simple_uploaded_file(self, image, file_name, options=None):
         """
         :param image:
             a python PIL ``Image`` instance.
@@ -177,24 +1569,62 @@ class SizedImageField(ImageField):
         :param file_name:
             The file name of the image.
 
+        :param options:
+            The field's or rendition's options. The ones in ``ENCODE_OPTIONS``
+            are passed on to PIL.
+
         :returns:
-            A django ``SimpleUploadedFile`` instance ready to be saved.
+            A django ``UploadedFile`` instance ready to be saved. The image
+            is encoded straight into its buffer, which is kept in memory up
+            to ``IMAGE_HELPER_SPOOL_MAX_SIZE`` bytes, whatever the format,
+            and on disk above that, so storages read it in chunks without
+            another copy.
         """
         extension = os.path.splitext(file_name)[1]
+        pil_format = self._get_pil_format(extension)
+        save_options = dict((key, value) for key, value in (options or {}).items() if key in ENCODE_OPTIONS)
+        save_options.update(self._get_metadata_options(image, pil_format, options))
 
         mimetype, encoding = mimetypes.guess_type(file_name)
-        content_type = mimetype or 'image/png'
+        content_type = mimetype or Image.MIME.get(pil_format) or 'image/png'
 
-        temp_handle = BytesIO()
-        image.save(temp_handle, self._get_pil_format(extension))
+        temp_handle = _SpooledImageFile(
+            max_size=get_setting('SPOOL_MAX_SIZE') or settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        with self._measure('encode', name=file_name, input_size=image.size) as event:
+            image.save(temp_handle, pil_format, **save_options)
+            size = event['bytes_written'] = temp_handle.tell()
+            event['output_size'] = image.size
         temp_handle.seek(0)  # rewind the file
 
-        suf = SimpleUploadedFile(
-            file_name,
-            temp_handle.read(),
-            content_type=content_type,
-        )
-        return suf
+        uploaded_file = UploadedFile(temp_handle, file_name, content_type=content_type, size=size)
+        uploaded_file.metadata = {'width': image.width, 'height': image.height, 'bytes': size, 'format': pil_format}
+        if self.metadata_field:
+            digest = hashlib.sha256()
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+            temp_handle.seek(0)
+            uploaded_file.metadata['hash'] = digest.hexdigest()
+        return uploaded_file
+
+    def _get_metadata_options(self, image, pil_format, options=None):
+        """
+        Returns the options PIL saves the metadata of `image` with: none
+        but the ICC profile of an image that couldn't be converted to sRGB,
+        unless the field's or rendition's options keep the metadata.
+        """
+        # PNGs otherwise keep the profile the image was opened with.
+        save_options = {'icc_profile': image.info.get('icc_profile')}
+        if not (options or {}).get('keep_metadata'):
+            return save_options
+        exif = image.getexif()
+        exif.pop(0x0112, None)
+        # Maker notes are where cameras keep their previews.
+        exif.get_ifd(0x8769).pop(0x927c, None)
+        if exif:
+            save_options['exif'] = exif.tobytes()
+        if image.info.get('xmp') and pil_format == 'WEBP':
+            save_options['xmp'] = image.info['xmp']
+        return save_options
 
     def _get_pil_format(self, extension):
         """
@@ -205,4 +1635,4 @@ class SizedImageField(ImageField):
             The file format PIL needs from the file extension.
             Eg. PNG or JPEG
         """
-        return Image.EXTENSION[extension.lower()]
+        return Image.registered_extensions()[extension.lower()]
@@ -0,0 +1,60 @@
+"""
+Bounds on the memory processing images takes: a pixel and byte budget
+checked from an image's header before it's decoded, and a cap on how many
+images the process decodes and resizes at once.
+"""
+import threading
+from contextlib import contextmanager
+
+from image_helper.conf import get_setting
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+class ResizeSlotTimeout(RuntimeError):
+    """
+    Raised when an image waited longer than
+    ``IMAGE_HELPER_RESIZE_WAIT_TIMEOUT`` for another one to be processed.
+    """
+
+
+def _get_semaphore(size):
+    with _semaphores_lock:
+        if size not in _semaphores:
+            _semaphores[size] = threading.BoundedSemaphore(size)
+        return _semaphores[size]
+
+
+@contextmanager
+def resize_slot():
+    """
+    Holds one of the ``IMAGE_HELPER_MAX_CONCURRENT_RESIZES`` slots of the
+    process while an image is decoded and resized, waiting up to
+    ``IMAGE_HELPER_RESIZE_WAIT_TIMEOUT`` seconds for one to be free.
+    """
+    size = get_setting('MAX_CONCURRENT_RESIZES')
+    if not size:
+        yield
+        return
+
+    semaphore = _get_semaphore(size)
+    if not semaphore.acquire(timeout=get_setting('RESIZE_WAIT_TIMEOUT')):
+        raise ResizeSlotTimeout("No resize slot was free after {} seconds.".format(
+            get_setting('RESIZE_WAIT_TIMEOUT')))
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def get_draft_size(image, max_pixels):
+    """
+    Returns the size to pass to ``Image.draft`` so a JPEG decodes within
+    `max_pixels`. PIL only reduces by 1/2, 1/4 or 1/8, so this is the
+    smallest of those scales that fits, or 1/8.
+    """
+    reduce = 1
+    while reduce < 8 and image.width * image.height > max_pixels * reduce * reduce:
+        reduce *= 2
+    return max(image.width // reduce, 1), max(image.height // reduce, 1)
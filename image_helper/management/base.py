@@ -0,0 +1,35 @@
+from itertools import islice
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from image_helper.fields import SizedImageField
+
+
+def batches(iterable, size):
+    """
+    Yields lists of up to `size` items of `iterable`.
+    """
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+class FieldCommand(BaseCommand):
+    """
+    A command working on the images of a ``SizedImageField``.
+    """
+
+    def _get_field(self, label):
+        try:
+            app_label, model_name, field_name = label.split('.')
+            model = apps.get_model(app_label, model_name)
+            field = model._meta.get_field(field_name)
+        except (ValueError, LookupError, FieldDoesNotExist) as e:
+            raise CommandError("Can't find field '{}': {}".format(label, e))
+        if not isinstance(field, SizedImageField):
+            raise CommandError("'{}' is not a SizedImageField.".format(label))
+        return model, field
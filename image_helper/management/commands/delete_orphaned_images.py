@@ -0,0 +1,182 @@
+import operator
+import os
+import posixpath
+from datetime import timedelta
+from functools import reduce
+
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from PIL import Image
+
+from image_helper.management.base import FieldCommand, batches
+
+# Number of names looked up per query, under SQLite's limit on query
+# parameters.
+QUERY_CHUNK_SIZE = 500
+
+
+def _listdir(storage, path):
+    """
+    Yields the name and whether it's a directory of every entry of `path`.
+    Local directories are read as they're iterated, others are listed at
+    once by the storage.
+    """
+    try:
+        local_path = storage.path(path)
+    except NotImplementedError:
+        directories, files = storage.listdir(path)
+        for directory in directories:
+            yield directory, True
+        for filename in files:
+            yield filename, False
+    else:
+        with os.scandir(local_path) as entries:
+            for entry in entries:
+                yield entry.name, entry.is_dir()
+
+
+def _walk(storage, path):
+    """
+    Yields the name of every file under `path`, one directory at a time.
+    Only the names of the subdirectories are kept while a directory is read.
+    """
+    directories = []
+    for name, is_directory in _listdir(storage, path):
+        name = posixpath.join(path, name) if path else name
+        if is_directory:
+            directories.append(name)
+        else:
+            yield name
+    for directory in directories:
+        yield from _walk(storage, directory)
+
+
+def _get_image_extensions(pil_format):
+    """
+    Returns the extensions an image of `pil_format` may be stored with, in
+    lower and upper case.
+    """
+    Image.init()
+    extensions = [extension for extension, registered_format in Image.registered_extensions().items()
+                  if registered_format == pil_format.upper()]
+    return sorted(set(extensions + [extension.upper() for extension in extensions]))
+
+
+def _chunks(names):
+    return [names[start:start + QUERY_CHUNK_SIZE] for start in range(0, len(names), QUERY_CHUNK_SIZE)]
+
+
+class Command(FieldCommand):
+    help = ("Deletes the files under the upload directory of SizedImageFields that no row references, "
+            "neither as an image nor as one of its renditions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('fields', nargs='+',
+                            help="The fields storing files in the directory, as app_label.Model.field. "
+                                 "Files of any other field stored there would be deleted.")
+        parser.add_argument('--path',
+                            help="Directory to sweep. Defaults to the static part of the first "
+                                 "field's upload_to.")
+        parser.add_argument('--min-age', type=int, default=60,
+                            help="Minutes a file must be old to be deleted, so uploads that aren't "
+                                 "committed yet are left alone.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="List the orphaned files without deleting them.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of listed files checked against the database at once.")
+
+    def handle(self, *args, **options):
+        fields = [self._get_field(label)[1] for label in options['fields']]
+        storage = fields[0].storage
+        if any(field.storage.deconstruct() != storage.deconstruct() for field in fields[1:]):
+            raise CommandError("The fields don't share a storage.")
+        path = options['path'] if options['path'] is not None else self._get_upload_path(fields[0])
+        cutoff = timezone.now() - timedelta(minutes=options['min_age']) if options['min_age'] else None
+
+        found = 0
+        names = _walk(storage, path)
+        for batch in batches(names, options['batch_size']):
+            orphans = [name for name in self._get_orphans(fields, batch)
+                       if cutoff is None or storage.get_modified_time(name) < cutoff]
+            found += len(orphans)
+            if options['dry_run']:
+                for name in orphans:
+                    self.stdout.write(name)
+            elif orphans:
+                fields[0]._delete_files(orphans)
+
+        if options['dry_run']:
+            self.stdout.write("Would delete {} orphaned files.".format(found))
+        else:
+            self.stdout.write("Deleted {} orphaned files.".format(found))
+
+    def _get_upload_path(self, field):
+        if callable(field.upload_to):
+            raise CommandError("Pass --path for fields with a callable upload_to.")
+        if '%' in field.upload_to:
+            return posixpath.dirname(field.upload_to.split('%')[0])
+        return field.upload_to.rstrip('/')
+
+    def _get_orphans(self, fields, names):
+        """
+        Returns the files of `names` that aren't an image of a row of
+        `fields`, or one of its renditions.
+        """
+        expected = set()
+        for field in fields:
+            pil_format = field.encode_options.get('format')
+            image_extensions = _get_image_extensions(pil_format) if pil_format else None
+            candidates, stems = set(), set()
+            for name in names:
+                image_names, image_stems = self._get_candidate_images(field, name, image_extensions)
+                candidates.update(image_names)
+                stems.update(image_stems)
+            lookups = [Q(**{field.attname + '__in': chunk}) for chunk in _chunks(sorted(candidates))]
+            lookups += [reduce(operator.or_, (Q(**{field.attname + '__startswith': stem + '.'}) for stem in chunk))
+                        for chunk in _chunks(sorted(stems))]
+            manager = field.model._default_manager
+            for lookup in lookups:
+                for name in manager.filter(lookup).values_list(field.attname, flat=True).distinct():
+                    expected.update(field._get_stored_filenames(name))
+        return [name for name in names if name not in expected]
+
+    def _get_candidate_images(self, field, name, image_extensions=None):
+        """
+        Returns the names of the images of `field` the file `name` could
+        have been stored for: itself, or the image it's a WebP copy or a
+        rendition of.
+
+        When the image's extension can't be told from the file's, because
+        it's a WebP copy or a rendition with a `format`, it's one of
+        `image_extensions`, those of the field's `format`. A field without
+        one keeps the upload's extension, whatever it is, so the image's
+        name without its extension is returned instead, to be looked up by
+        prefix.
+
+        :returns:
+            A tuple of the set of names and the set of name stems.
+        """
+        stem, extension = os.path.splitext(name)
+        is_webp = extension.lower() == '.webp'
+
+        candidates, stems = {name}, set()
+
+        def add_unknown_extension(image_stem):
+            if image_extensions is None:
+                stems.add(image_stem)
+            else:
+                candidates.update(image_stem + image_extension for image_extension in image_extensions)
+
+        if is_webp and field.encode_options.get('webp'):
+            add_unknown_extension(stem)
+        for rendition, options in field.renditions.items():
+            if not stem.endswith('-' + rendition):
+                continue
+            image_stem = stem[:-len(rendition) - 1]
+            if options.get('format') or (is_webp and options.get('webp')):
+                add_unknown_extension(image_stem)
+            if not options.get('format'):
+                candidates.add(image_stem + extension)
+        return candidates, stems
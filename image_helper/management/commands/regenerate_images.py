@@ -0,0 +1,105 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from image_helper.management.base import FieldCommand, batches
+from image_helper.tasks import render_renditions
+
+
+class Command(FieldCommand):
+    help = "Regenerates the renditions of every image stored in a SizedImageField."
+
+    def add_arguments(self, parser):
+        parser.add_argument('field', help="The field to regenerate, as app_label.Model.field")
+        parser.add_argument('--only-missing', action='store_true',
+                            help="Only regenerate images with a missing rendition.")
+        parser.add_argument('--since',
+                            help="Only regenerate images added since this date or datetime.")
+        parser.add_argument('--date-field',
+                            help="Model field --since is compared to. Defaults to the "
+                                 "modified time of the stored image.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="List the images that would be regenerated without doing it.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Number of worker processes. 0 does the work in this process.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of images rendered before their renditions are written.")
+
+    def handle(self, *args, **options):
+        model, field = self._get_field(options['field'])
+        since = self._get_since(options['since'])
+
+        queryset = model._default_manager.exclude(**{field.attname: ''}).exclude(**{field.attname + '__isnull': True})
+        modified_since = None
+        if since and options['date_field']:
+            queryset = queryset.filter(**{options['date_field'] + '__gte': since})
+        elif since:
+            modified_since = since
+
+        names = queryset.order_by('pk').values_list(field.attname, flat=True).iterator(
+            chunk_size=options['batch_size'])
+        render = partial(render_renditions, model._meta.label, field.name,
+                         only_missing=options['only_missing'], modified_since=modified_since)
+
+        if options['dry_run']:
+            return self._dry_run(field, names, options['only_missing'], modified_since)
+
+        regenerated = skipped = failed = 0
+        executor = None
+        if options['workers'] != 0:
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+        try:
+            for batch in batches(names, options['batch_size']):
+                results = executor.map(render, batch) if executor else map(render, batch)
+                for name, renditions, error in results:
+                    if error:
+                        failed += 1
+                        self.stderr.write("Failed {}: {}".format(name, error))
+                    elif not renditions:
+                        skipped += 1
+                    else:
+                        regenerated += 1
+                        self._save_renditions(field, name, renditions)
+                self.stdout.write("Processed {} images".format(regenerated + skipped + failed))
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write("Regenerated {}, skipped {}, failed {}.".format(regenerated, skipped, failed))
+
+    def _dry_run(self, field, names, only_missing, modified_since):
+        count = 0
+        for name in names:
+            if modified_since and field.storage.get_modified_time(name) < modified_since:
+                continue
+            if only_missing and all(field.storage.exists(field._get_rendition_filename(name, rendition))
+                                    for rendition in field._get_saved_renditions()):
+                continue
+            count += 1
+            self.stdout.write(name)
+        self.stdout.write("Would regenerate {} images.".format(count))
+
+    def _save_renditions(self, field, name, renditions):
+        files = {}
+        for rendition_filename, content, metadata in renditions:
+            field._replace_file(rendition_filename, ContentFile(content))
+            files[rendition_filename] = metadata
+        field._update_rendition_metadata(name, files)
+
+    def _get_since(self, since):
+        if not since:
+            return None
+        value = parse_datetime(since)
+        if value is None and parse_date(since):
+            value = parse_datetime(since + "T00:00:00")
+        if value is None:
+            raise CommandError("Can't parse --since '{}'.".format(since))
+        if timezone.is_naive(value) and settings.USE_TZ:
+            value = timezone.make_aware(value)
+        return value
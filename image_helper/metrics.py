@@ -0,0 +1,144 @@
+"""
+Timing of the stages SizedImageField goes through when processing an
+image, sent as the ``image_stage_finished`` signal and to the sink named by
+the ``IMAGE_HELPER_METRICS_SINK`` setting.
+"""
+import logging
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.utils.module_loading import import_string
+
+from image_helper.conf import get_setting
+from image_helper.signals import image_stage_finished
+
+logger = logging.getLogger(__name__)
+
+_sinks = {}
+
+
+class BaseMetricsSink(object):
+    """
+    Receives every stage event. Subclass and implement ``record`` to send
+    them to a metrics system.
+    """
+
+    def record(self, model, field, stage, duration, **event):
+        """
+        :param model: The label of the model, eg. 'app_label.Model'.
+        :param field: The name of the field.
+        :param stage: The stage, eg. 'resize'.
+        :param duration: The stage's duration in seconds.
+        :param event: `name`, `input_size`, `output_size`, `bytes_written`
+            and `failed`, True when the stage raised.
+        """
+        raise NotImplementedError
+
+
+class InMemoryMetricsSink(BaseMetricsSink):
+    """
+    Aggregates events in memory, Prometheus style: a count, total duration
+    and total bytes written for every model, field and stage.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = defaultdict(int)
+            self.failures = defaultdict(int)
+            self.durations = defaultdict(float)
+            self.bytes_written = defaultdict(int)
+
+    def record(self, model, field, stage, duration, **event):
+        key = (model, field, stage)
+        with self.lock:
+            self.counts[key] += 1
+            self.failures[key] += 1 if event.get('failed') else 0
+            self.durations[key] += duration
+            self.bytes_written[key] += event.get('bytes_written') or 0
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for metric, values in (('image_helper_stage_total', self.counts),
+                                   ('image_helper_stage_failures_total', self.failures),
+                                   ('image_helper_stage_seconds_total', self.durations),
+                                   ('image_helper_stage_bytes_total', self.bytes_written)):
+                lines.append('# TYPE {} counter'.format(metric))
+                for (model, field, stage), value in sorted(values.items()):
+                    lines.append('{}{{model="{}",field="{}",stage="{}"}} {}'.format(
+                        metric, model, field, stage, value))
+        return '\n'.join(lines) + '\n'
+
+
+class StatsdMetricsSink(BaseMetricsSink):
+    """
+    Sends a timer, and counters of bytes written and failures, per event to
+    a statsd server over UDP, configured with ``IMAGE_HELPER_STATSD_ADDRESS``.
+    """
+
+    def __init__(self):
+        self.address = get_setting('STATSD_ADDRESS')
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def record(self, model, field, stage, duration, **event):
+        prefix = 'image_helper.{}.{}.{}'.format(model.replace('.', '_'), field, stage)
+        lines = ['{}:{:.3f}|ms'.format(prefix, duration * 1000)]
+        if event.get('bytes_written'):
+            lines.append('{}.bytes:{}|c'.format(prefix, event['bytes_written']))
+        if event.get('failed'):
+            lines.append('{}.failed:1|c'.format(prefix))
+        try:
+            self.socket.sendto('\n'.join(lines).encode('utf-8'), self.address)
+        except (OSError, IOError):
+            pass
+
+
+def get_sink():
+    """
+    Returns the sink named by ``IMAGE_HELPER_METRICS_SINK``, or None.
+    Sinks are created once and reused.
+    """
+    path = get_setting('METRICS_SINK')
+    if not path:
+        return None
+    if path not in _sinks:
+        _sinks[path] = import_string(path)()
+    return _sinks[path]
+
+
+@contextmanager
+def measure_stage(field, stage, name=None, input_size=None):
+    """
+    Times the block and reports it as `stage` of `field`, with `failed`
+    set when the block raised. A sink that fails is logged, it doesn't fail
+    the block.
+
+    Yields a dict the block can fill with `output_size` and `bytes_written`.
+    """
+    event = {'name': name, 'input_size': input_size, 'output_size': None, 'bytes_written': None, 'failed': True}
+    started = time.perf_counter()
+    try:
+        yield event
+        event['failed'] = False
+    finally:
+        duration = time.perf_counter() - started
+
+        model = getattr(field, 'model', None)
+        image_stage_finished.send(sender=model, field=field, stage=stage, duration=duration, **event)
+
+        sink = get_sink()
+        if sink is not None:
+            try:
+                sink.record(model._meta.label if model else None, field.name, stage, duration, **event)
+            except Exception:
+                logger.exception("Recording stage %s of %s failed.", stage, field.name)
@@ -0,0 +1,79 @@
+"""
+Strategies naming the images a ``SizedImageField`` saves, picked with its
+`naming` option. Renditions are named after the image, eg.
+``photo-thumbnail.jpg`` next to ``photo.jpg``, whatever the strategy.
+
+A strategy is an object with a ``get_name(field, model_instance, filename)``
+method returning the name of the uploaded `filename`, relative to the
+field's ``upload_to``, and a ``unique`` attribute. When ``unique`` is True
+the names it returns are never taken, so files are written under them
+without asking the storage whether they exist.
+"""
+import os
+import posixpath
+import uuid
+
+from django.utils.module_loading import import_string
+
+
+class AvailableName(object):
+    """
+    Keeps the upload's file name, with a random suffix added by the storage
+    when it's taken. Each upload costs at least one ``exists()`` call, more
+    for common names such as ``image.jpg``.
+    """
+    unique = False
+
+    def get_name(self, field, model_instance, filename):
+        available_name = field.storage.get_available_name(field.generate_filename(model_instance, filename))
+        return os.path.basename(available_name)
+
+
+class UUIDName(object):
+    """
+    Names files with a random UUID, keeping the upload's extension.
+    """
+    unique = True
+
+    def get_name(self, field, model_instance, filename):
+        return uuid.uuid4().hex + os.path.splitext(filename)[1].lower()
+
+
+class ShardedName(UUIDName):
+    """
+    Names files with a random UUID under `depth` directories named after
+    its first characters, eg. ``3f/a2/3fa2...jpg``, so object stores spread
+    the keys over many prefixes.
+    """
+
+    def __init__(self, depth=2, width=2):
+        self.depth = depth
+        self.width = width
+
+    def get_name(self, field, model_instance, filename):
+        name = super(ShardedName, self).get_name(field, model_instance, filename)
+        prefixes = [name[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return posixpath.join(*prefixes + [name])
+
+
+NAMING_STRATEGIES = {
+    'available': AvailableName,
+    'uuid': UUIDName,
+    'sharded': ShardedName,
+}
+
+
+def get_naming(naming):
+    """
+    Returns the strategy `naming` stands for: the name of one of
+    ``NAMING_STRATEGIES``, the dotted path of a strategy class, or a
+    strategy.
+    """
+    if naming in NAMING_STRATEGIES:
+        return NAMING_STRATEGIES[naming]()
+    if isinstance(naming, str):
+        try:
+            return import_string(naming)()
+        except ImportError:
+            raise ValueError("Unknown naming strategy {!r}.".format(naming))
+    return naming
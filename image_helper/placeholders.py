@@ -0,0 +1,135 @@
+"""
+Tiny placeholders of an image, computed while it's decoded and stored in a
+column of the model by a ``SizedImageField`` with a `placeholder_field`, so
+pages show something in its place before the image loads, without another
+request:
+
+    - 'blurhash': a BlurHash (https://blurha.sh) string, around 30
+      characters, that a script decodes into a blurred preview.
+    - 'color': the image's dominant color, eg. '#a3b1c4'.
+    - 'webp': a WebP, 16px on its longest side, as a base64 ``data:`` url
+      of a few hundred characters.
+"""
+import base64
+import math
+from io import BytesIO
+
+from PIL import Image
+
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+# Components of the BlurHash along the width and the height.
+BLURHASH_COMPONENTS = (4, 3)
+# Longest side the image is reduced to before computing a BlurHash, more
+# pixels hardly change the result.
+BLURHASH_SIZE = 32
+WEBP_SIZE = 16
+WEBP_QUALITY = 40
+
+_SRGB_TO_LINEAR = [value / 255.0 / 12.92 if value / 255.0 <= 0.04045 else ((value / 255.0 + 0.055) / 1.055) ** 2.4
+                   for value in range(256)]
+
+
+def _reduce(image, size):
+    image = image.convert('RGB')
+    image.thumbnail((size, size), Image.BOX)
+    return image
+
+
+def _encode83(value, length):
+    return ''.join(BASE83[value // 83 ** (length - i) % 83] for i in range(1, length + 1))
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _quantize_ac(value, max_value):
+    value = value / max_value
+    value = math.copysign(abs(value) ** 0.5, value)
+    return max(0, min(18, int(math.floor(value * 9 + 9.5))))
+
+
+def get_blurhash(image, components=BLURHASH_COMPONENTS):
+    """
+    Returns the BlurHash of a PIL image.
+    """
+    image = _reduce(image, BLURHASH_SIZE)
+    width, height = image.size
+    pixels = [tuple(_SRGB_TO_LINEAR[channel] for channel in pixel) for pixel in image.getdata()]
+
+    x_components, y_components = components
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            red = green = blue = 0.0
+            for index, (pixel_red, pixel_green, pixel_blue) in enumerate(pixels):
+                basis = cos_x[index % width] * cos_y[index // width]
+                red += basis * pixel_red
+                green += basis * pixel_green
+                blue += basis * pixel_blue
+            scale = (1.0 if i == j == 0 else 2.0) / (width * height)
+            factors.append((red * scale, green * scale, blue * scale))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = _encode83(x_components - 1 + (y_components - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(value) for factor in ac for value in factor)
+        quantized_max = max(0, min(82, int(math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantized_max + 1) / 166.0
+    else:
+        quantized_max, max_value = 0, 1.0
+    blurhash += _encode83(quantized_max, 1)
+    blurhash += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for red, green, blue in ac:
+        blurhash += _encode83(_quantize_ac(red, max_value) * 19 * 19 + _quantize_ac(green, max_value) * 19
+                              + _quantize_ac(blue, max_value), 2)
+    return blurhash
+
+
+def get_dominant_color(image):
+    """
+    Returns the most common of a handful of colors the image is reduced to,
+    as a hex color.
+    """
+    colors = _reduce(image, 64).quantize(5)
+    count, index = max(colors.getcolors())
+    red, green, blue = colors.getpalette()[index * 3:index * 3 + 3]
+    return '#{:02x}{:02x}{:02x}'.format(red, green, blue)
+
+
+def get_webp(image):
+    """
+    Returns a tiny WebP of the image as a ``data:`` url.
+    """
+    handle = BytesIO()
+    _reduce(image, WEBP_SIZE).save(handle, 'WEBP', quality=WEBP_QUALITY)
+    return 'data:image/webp;base64,' + base64.b64encode(handle.getvalue()).decode('ascii')
+
+
+PLACEHOLDERS = {
+    'blurhash': get_blurhash,
+    'color': get_dominant_color,
+    'webp': get_webp,
+}
+
+
+def get_placeholder_attributes(placeholder):
+    """
+    Returns a list of the (name, value) of the attributes that show
+    `placeholder` on the ``<img>`` of an image until it loads: a background
+    for colors and WebPs, a ``data-blurhash`` attribute for a script to
+    decode BlurHashes.
+    """
+    if not placeholder:
+        return []
+    if placeholder.startswith('#') and len(placeholder) == 7:
+        return [('style', 'background-color: {}'.format(placeholder))]
+    if placeholder.startswith('data:'):
+        return [('style', 'background-image: url({}); background-size: cover'.format(placeholder))]
+    return [('data-blurhash', placeholder)]
@@ -0,0 +1,112 @@
+"""
+Resolves the rendition urls of many instances at once, so a list of
+thumbnails costs a handful of cache and storage round trips instead of a
+few per row.
+
+    prefetch_renditions(TestModel.objects.all(), 'image', ['thumbnail'])
+
+The results are kept on the rendition files, so ``obj.image.thumbnail.url``
+in templates and admin ``list_display`` callables picks them up as is.
+
+Storages that can look up several files in one call may implement
+``url_many(names)``, ``size_many(names)`` or ``exists_many(names)``, each
+returning a dict of name to the result. Others are asked one file at a time,
+like ``ThumbnailField`` would.
+"""
+from django.db.models.query import ModelIterable, QuerySet
+
+from image_helper.cache import get_many_file_metadata
+
+LOOKUPS = ('url', 'size', 'exists')
+
+
+def _lookup_many(storage, key, names):
+    bulk = getattr(storage, key + '_many', None)
+    if bulk is not None:
+        return bulk(names)
+    lookup = getattr(storage, key)
+    return dict((name, lookup(name)) for name in names)
+
+
+def prefetch_renditions(instances, field_name, renditions=None, lookups=('url',)):
+    """
+    Resolves and attaches rendition lookups of `instances`.
+
+    :param instances:
+        A queryset or a list of model instances. A queryset is evaluated.
+
+    :param field_name:
+        The name of a ``SizedImageField`` of the instances.
+
+    :param renditions:
+        Names of the renditions to resolve, all of the field's by default.
+
+    :param lookups:
+        Any of 'url', 'size' and 'exists'. 'exists' is also resolved for the
+        url of renditions that may not exist yet.
+
+    :returns:
+        `instances`.
+    """
+    unknown = set(lookups) - set(LOOKUPS)
+    if unknown:
+        raise ValueError("Unknown lookups: {}".format(', '.join(sorted(unknown))))
+
+    files = [getattr(instance, field_name) for instance in instances]
+    files = [file for file in files if file]
+    if not files:
+        return instances
+
+    field = files[0].field
+    for rendition in (field.renditions if renditions is None else renditions):
+        rendition_files = [getattr(file, rendition) for file in files]
+        keys = list(lookups)
+        if 'url' in keys and any(rendition_file.needs_exists_check for rendition_file in rendition_files):
+            keys.insert(0, 'exists')
+        for key in keys:
+            values = get_many_file_metadata(
+                field.storage, set(rendition_file.name for rendition_file in rendition_files), key,
+                lambda names, key=key: _lookup_many(field.storage, key, names))
+            for rendition_file in rendition_files:
+                rendition_file._prefetched[key] = values[rendition_file.name]
+    return instances
+
+
+class RenditionQuerySet(QuerySet):
+    """
+    A queryset that resolves rendition lookups of the page of instances it
+    fetches, like ``prefetch_related`` does for relations. Use it as the
+    model's manager to prefetch in the admin:
+
+        objects = RenditionQuerySet.as_manager()
+
+        def get_queryset(self, request):
+            return super().get_queryset(request).prefetch_renditions('image', ['thumbnail'])
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(RenditionQuerySet, self).__init__(*args, **kwargs)
+        self._rendition_prefetches = []
+        self._renditions_prefetched = False
+
+    def prefetch_renditions(self, field_name, renditions=None, lookups=('url',)):
+        """
+        Returns a copy of the queryset that calls ``prefetch_renditions``
+        on its results once they're fetched.
+        """
+        clone = self._chain()
+        clone._rendition_prefetches.append((field_name, renditions, lookups))
+        return clone
+
+    def _clone(self):
+        clone = super(RenditionQuerySet, self)._clone()
+        clone._rendition_prefetches = list(self._rendition_prefetches)
+        return clone
+
+    def _fetch_all(self):
+        super(RenditionQuerySet, self)._fetch_all()
+        if self._rendition_prefetches and not self._renditions_prefetched and \
+                issubclass(self._iterable_class, ModelIterable):
+            for field_name, renditions, lookups in self._rendition_prefetches:
+                prefetch_renditions(self._result_cache, field_name, renditions, lookups)
+            self._renditions_prefetched = True
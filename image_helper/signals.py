@@ -0,0 +1,12 @@
+from django.dispatch import Signal
+
+# Sent by SizedImageField after each stage of processing an image: 'open'
+# (decode), 'orient', 'convert', 'resize', 'rendition', 'encode',
+# 'placeholder' and 'storage_save'.
+#
+# The sender is the model class, and receivers get the `field`, the `stage`,
+# its `duration` in seconds, the file `name` when there is one, the
+# `input_size` and `output_size` of the image as (width, height) tuples and
+# the `bytes_written` by the encode and storage_save stages. `failed` is True
+# when the stage raised.
+image_stage_finished = Signal()
@@ -0,0 +1,199 @@
+import logging
+import posixpath
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import django
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connections
+from django.utils.module_loading import import_string
+
+from image_helper.conf import get_setting
+from image_helper.limits import resize_slot
+
+logger = logging.getLogger(__name__)
+
+_backends = {}
+_write_executors = {}
+_inherited_connections = []
+
+
+def process_image(model_label, field_name, name):
+    """
+    Resizes a stored image and creates its renditions.
+
+    This is the unit of work a deferred ``SizedImageField`` queues after the
+    original is saved. It only takes strings so any task queue can pickle
+    or serialize the call.
+    """
+    field = apps.get_model(model_label)._meta.get_field(field_name)
+    field._process_stored_image(name)
+
+
+def render_renditions(model_label, field_name, name, only_missing=False, modified_since=None):
+    """
+    Renders the renditions of a stored image without saving them, so the
+    caller can write them where and when it wants.
+
+    :returns:
+        A tuple of `name`, a list of (rendition file name, bytes, metadata)
+        and an error message. The list is empty when the image was skipped.
+    """
+    field = apps.get_model(model_label)._meta.get_field(field_name)
+    storage = field.storage
+    try:
+        if modified_since and storage.get_modified_time(name) < modified_since:
+            return name, [], None
+        if only_missing and all(storage.exists(field._get_rendition_filename(name, rendition))
+                                for rendition in field._get_saved_renditions()):
+            return name, [], None
+
+        with storage.open(name) as stored:
+            image = field._open_image(stored)
+            return name, [(rendition_filename, rendition_file.read(), rendition_file.metadata)
+                          for rendition_filename, rendition_file in field._render_renditions(image, name)], None
+    except Exception as e:
+        return name, [], "{}: {}".format(e.__class__.__name__, e)
+
+
+def render_upload(model_label, field_name, name, content):
+    """
+    Resizes an upload and renders its renditions without saving anything,
+    for ``SizedImageField.process_batch``.
+
+    :param name:
+        The name the image will be stored under.
+
+    :param content:
+        The bytes of the upload.
+
+    :returns:
+        A tuple of `name`, the resized image as (bytes, metadata,
+        placeholder), a list of (rendition file name, bytes, metadata) and
+        an error message.
+    """
+    field = apps.get_model(model_label)._meta.get_field(field_name)
+    try:
+        with resize_slot():
+            image = field._open_resized_image(ContentFile(content, name=posixpath.basename(name)), name)
+            renditions = [(rendition_filename, rendition_file.read(), rendition_file.metadata)
+                          for rendition_filename, rendition_file in field._render_renditions(image, name)]
+            encoded = field._get_simple_uploaded_file(image, posixpath.basename(name), field.encode_options)
+            placeholder = field._render_placeholder(image, name)
+        return name, (encoded.read(), encoded.metadata, placeholder), renditions, None
+    except Exception as e:
+        return name, None, [], "{}: {}".format(e.__class__.__name__, e)
+
+
+class BaseTaskBackend(object):
+    """
+    Runs deferred image work. Subclass and implement ``submit`` to hand
+    the work to a task queue such as Celery or RQ.
+    """
+
+    def submit(self, func, *args):
+        """
+        :param func:
+            An importable, module level function.
+
+        :param args:
+            Arguments for `func`, all strings.
+        """
+        raise NotImplementedError
+
+
+class SyncBackend(BaseTaskBackend):
+    """
+    Runs the work right away in the current thread.
+    """
+
+    def submit(self, func, *args):
+        func(*args)
+
+
+def _setup_worker():
+    """
+    Sets Django up in a worker process, without the database connections
+    a forked worker inherits from its parent.
+
+    Those share their socket with the parent's, closing them would end the
+    parent's session. They're only forgotten, and kept referenced so they
+    aren't closed when collected either.
+    """
+    django.setup()
+    for connection in connections.all():
+        if connection.connection is not None:
+            _inherited_connections.append(connection.connection)
+            connection.connection = None
+
+
+def _run_task(func, *args):
+    """
+    Runs `func` in a pool worker the way Django runs a request, dropping
+    connections that broke or outlived ``CONN_MAX_AGE`` before and after.
+    """
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def _log_failure(func, args, future):
+    try:
+        future.result()
+    except Exception:
+        logger.exception("%s%r failed.", func.__name__, args)
+
+
+class ThreadPoolBackend(BaseTaskBackend):
+    """
+    Runs the work on an in-process thread pool shared by all fields. Work
+    that fails is logged.
+    """
+    executor_class = ThreadPoolExecutor
+
+    def __init__(self):
+        self.executor = self.executor_class(**self.get_executor_options())
+
+    def get_executor_options(self):
+        return {'max_workers': get_setting('TASK_WORKERS')}
+
+    def submit(self, func, *args):
+        future = self.executor.submit(_run_task, func, *args)
+        future.add_done_callback(partial(_log_failure, func, args))
+        return future
+
+
+class ProcessPoolBackend(ThreadPoolBackend):
+    """
+    Runs the work on a ``concurrent.futures`` process pool, which keeps
+    decoding and resizing off the interpreter serving requests.
+    """
+    executor_class = ProcessPoolExecutor
+
+    def get_executor_options(self):
+        return dict(super(ProcessPoolBackend, self).get_executor_options(), initializer=_setup_worker)
+
+
+def get_backend():
+    """
+    Returns the backend named by the ``IMAGE_HELPER_TASK_BACKEND`` setting.
+    Backends are created once and reused.
+    """
+    path = get_setting('TASK_BACKEND')
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+def get_write_executor():
+    """
+    Returns the thread pool fields with `concurrent_writes` write their
+    renditions on, sized by the ``IMAGE_HELPER_WRITE_WORKERS`` setting.
+    """
+    workers = get_setting('WRITE_WORKERS')
+    if workers not in _write_executors:
+        _write_executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image_helper_write')
+    return _write_executors[workers]
@@ -0,0 +1,113 @@
+"""
+Template tags rendering responsive images of a ``SizedImageField``:
+
+    {% load image_helper_tags %}
+    {% responsive_image obj.image sizes="(max-width: 600px) 100vw, 50vw" alt=obj.name class="photo" %}
+    <img src="{{ obj.image.url }}" srcset="{{ obj.image|srcset }}">
+    <div style="background-color: {{ obj.image.placeholder }}"></div>
+"""
+import hashlib
+from collections import OrderedDict
+from functools import partial
+
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from image_helper.cache import get_file_metadata
+from image_helper.placeholders import get_placeholder_attributes
+
+register = template.Library()
+
+
+def _is_resolved(rendition_file):
+    """
+    Whether the url of a rendition is the one it will keep, rather than a
+    placeholder until it's created.
+    """
+    return not rendition_file.needs_exists_check or rendition_file.exists()
+
+
+def _get_candidates(image, rendition_files):
+    """
+    Returns a list of (url, width) of the image and its renditions,
+    narrowest first, leaving out renditions that are only a placeholder
+    and files whose width isn't known.
+    """
+    field = image.field
+    candidates = []
+    dimensions = field._get_file_dimensions(image)
+    if dimensions:
+        candidates.append((image.url, dimensions[0]))
+    for rendition, rendition_file in zip(field.renditions, rendition_files):
+        if rendition_file.generate_url or _is_resolved(rendition_file):
+            dimensions = field._get_file_dimensions(image, rendition)
+            if dimensions:
+                candidates.append((rendition_file.url, dimensions[0]))
+
+    widths = set()
+    unique = []
+    for url, width in sorted(candidates, key=lambda candidate: candidate[1]):
+        if width not in widths:
+            widths.add(width)
+            unique.append((url, width))
+    return unique
+
+
+def _get_srcset(image, rendition_files):
+    return ', '.join('{} {}w'.format(url, width) for url, width in _get_candidates(image, rendition_files))
+
+
+def _render_image(image, rendition_files, sizes, attrs):
+    field = image.field
+    dimensions = field._get_file_dimensions(image)
+    if dimensions is None and field.renditions:
+        dimensions = field._get_file_dimensions(image, next(iter(field.renditions)))
+
+    attributes = OrderedDict([('src', image.url)])
+    srcset = _get_srcset(image, rendition_files)
+    if srcset:
+        attributes['srcset'] = srcset
+        attributes['sizes'] = sizes
+    if dimensions:
+        attributes['width'], attributes['height'] = dimensions
+    attributes.update([('alt', ''), ('loading', 'lazy'), ('decoding', 'async')])
+    attributes.update(get_placeholder_attributes(image.placeholder))
+    attributes.update((name.replace('_', '-'), value) for name, value in sorted(attrs.items()))
+    return format_html('<img {} />', format_html_join(' ', '{}="{}"', attributes.items()))
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', **attrs):
+    """
+    Renders an ``<img>`` of the image of a ``SizedImageField`` offering its
+    renditions in a ``srcset``, with the intrinsic width and height, lazily
+    loaded. The field's placeholder, when it stores one, is shown until the
+    image loads. Other keyword arguments are added as attributes, with
+    underscores replaced by dashes, eg. ``data_id=obj.pk``.
+
+    The markup is cached per file name and field options once every
+    rendition exists, so rendering it again doesn't resolve any url.
+    """
+    if not image:
+        return ''
+
+    field = image.field
+    rendition_files = [getattr(image, rendition) for rendition in field.renditions]
+    render = partial(_render_image, image, rendition_files, sizes, attrs)
+    if not all(_is_resolved(rendition_file) for rendition_file in rendition_files):
+        return render()
+
+    key = 'markup:' + hashlib.md5(repr((field._get_spec(), image.placeholder, sizes, sorted(attrs.items())))
+                                  .encode('utf-8')).hexdigest()
+    return get_file_metadata(field.storage, image.name, key, render)
+
+
+@register.filter
+def srcset(image):
+    """
+    Returns the ``srcset`` of the image of a ``SizedImageField`` and its
+    renditions.
+    """
+    if not image:
+        return ''
+    return _get_srcset(image, [getattr(image, rendition) for rendition in image.field.renditions])
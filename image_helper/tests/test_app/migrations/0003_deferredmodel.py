@@ -0,0 +1,24 @@
+from django.db import migrations, models
+import image_helper.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0002_renditionmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeferredModel',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')),
+                ('image',
+                 image_helper.fields.SizedImageField(upload_to='test_images')),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+import image_helper.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0007_cleanupmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetadataModel',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')),
+                ('image',
+                 image_helper.fields.SizedImageField(
+                     upload_to='test_images', width_field='width', height_field='height')),
+                ('width', models.IntegerField(null=True)),
+                ('height', models.IntegerField(null=True)),
+                ('image_metadata', models.JSONField(null=True, editable=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeferredMetadataModel',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')),
+                ('image',
+                 image_helper.fields.SizedImageField(upload_to='test_images')),
+                ('image_metadata', models.JSONField(null=True, editable=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import image_helper.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0008_metadatamodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceholderModel',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')),
+                ('image',
+                 image_helper.fields.SizedImageField(upload_to='test_images')),
+                ('image_placeholder', models.TextField(null=True, editable=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeferredPlaceholderModel',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')),
+                ('image',
+                 image_helper.fields.SizedImageField(upload_to='test_images')),
+                ('image_placeholder', models.TextField(null=True, editable=False)),
+            ],
+        ),
+    ]
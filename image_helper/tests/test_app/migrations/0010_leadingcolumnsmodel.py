@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import image_helper.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0009_placeholdermodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadingColumnsModel',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')),
+                ('image_metadata', models.JSONField(null=True, editable=False)),
+                ('image_placeholder', models.TextField(null=True, editable=False)),
+                ('image',
+                 image_helper.fields.SizedImageField(upload_to='test_images')),
+            ],
+        ),
+    ]
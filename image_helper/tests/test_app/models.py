@@ -1,7 +1,83 @@
 from django.db import models
 from image_helper.fields import SizedImageField
+from image_helper.prefetch import RenditionQuerySet
 
 
 class TestModel(models.Model):
     image = SizedImageField(
         upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100))
+
+
+class RenditionModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100),
+        renditions={'small': (50, 50), 'medium': (120, 120)})
+
+    objects = RenditionQuerySet.as_manager()
+
+
+class DeferredModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100), deferred=True)
+
+
+class FormatModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), format='JPEG', quality=85, progressive=True,
+        renditions={'thumbnail': {'size': (100, 100), 'format': 'WEBP', 'quality': 70},
+                    'small': {'size': (50, 50), 'webp': True}})
+
+
+class ContentAddressedModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100), content_addressed=True)
+
+
+class OnDemandModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150),
+        renditions={'thumbnail': (100, 100), 'small': {'size': (50, 50), 'on_demand': True, 'webp': True}})
+
+
+class CleanupModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100), webp=True,
+        delete_with_model=True, delete_on_replace=True)
+
+
+class MetadataModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100), webp=True,
+        width_field='width', height_field='height', metadata_field='image_metadata')
+    width = models.IntegerField(null=True)
+    height = models.IntegerField(null=True)
+    image_metadata = models.JSONField(null=True, editable=False)
+
+
+class DeferredMetadataModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100), deferred=True,
+        metadata_field='image_metadata')
+    image_metadata = models.JSONField(null=True, editable=False)
+
+
+class PlaceholderModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100),
+        placeholder_field='image_placeholder', placeholder='color')
+    image_placeholder = models.TextField(null=True, editable=False)
+
+
+class DeferredPlaceholderModel(models.Model):
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100), deferred=True,
+        placeholder_field='image_placeholder')
+    image_placeholder = models.TextField(null=True, editable=False)
+
+
+class LeadingColumnsModel(models.Model):
+    image_metadata = models.JSONField(null=True, editable=False)
+    image_placeholder = models.TextField(null=True, editable=False)
+    image = SizedImageField(
+        upload_to='test_images', size=(220, 150), thumbnail_size=(100, 100),
+        metadata_field='image_metadata', placeholder_field='image_placeholder', placeholder='color')
@@ -0,0 +1,57 @@
+from unittest import mock
+
+from django import test
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+
+from image_helper.cache import get_file_metadata, get_many_file_metadata, invalidate_file_metadata
+from image_helper.fields import ThumbnailField
+
+
+class FileMetadataCacheTests(test.TestCase):
+    def setUp(self):
+        cache.clear()
+        self.storage = FileSystemStorage(location='/tmp/images', base_url='/media/')
+
+    def test_thumbnail_lookups_hit_storage_once(self):
+        thumbnail = ThumbnailField("photo-thumbnail.png", self.storage)
+        with mock.patch.object(self.storage, 'url', return_value='/media/photo-thumbnail.png') as url, \
+                mock.patch.object(self.storage, 'size', return_value=1024) as size:
+            for _ in range(3):
+                self.assertEqual('/media/photo-thumbnail.png', thumbnail.url)
+                self.assertEqual(1024, thumbnail.size)
+        url.assert_called_once_with("photo-thumbnail.png")
+        size.assert_called_once_with("photo-thumbnail.png")
+
+    def test_invalidate_forgets_lookups(self):
+        compute = mock.Mock(side_effect=[1024, 2048])
+        self.assertEqual(1024, get_file_metadata(self.storage, "photo.png", 'size', compute))
+        invalidate_file_metadata(self.storage, "photo.png")
+        self.assertEqual(2048, get_file_metadata(self.storage, "photo.png", 'size', compute))
+
+    def test_missing_files_are_not_remembered(self):
+        compute = mock.Mock(side_effect=[False, True, False])
+        self.assertFalse(get_file_metadata(self.storage, "photo.png", 'exists', compute))
+        for _ in range(2):
+            self.assertTrue(get_file_metadata(self.storage, "photo.png", 'exists', compute))
+        self.assertEqual(2, compute.call_count)
+
+    def test_missing_files_looked_up_in_bulk_are_not_remembered(self):
+        compute_many = mock.Mock(side_effect=lambda names: dict((name, name == "a.png") for name in names))
+        names = ["a.png", "b.png"]
+        get_many_file_metadata(self.storage, names, 'exists', compute_many)
+        get_many_file_metadata(self.storage, names, 'exists', compute_many)
+        compute_many.assert_called_with(["b.png"])
+
+    def test_keys_on_storage(self):
+        other_storage = FileSystemStorage(location='/tmp/other', base_url='/other/')
+        get_file_metadata(self.storage, "photo.png", 'url', lambda: '/media/photo.png')
+        self.assertEqual('/other/photo.png',
+                         get_file_metadata(other_storage, "photo.png", 'url', lambda: '/other/photo.png'))
+
+    @test.override_settings(IMAGE_HELPER_CACHE=None)
+    def test_can_be_disabled(self):
+        compute = mock.Mock(return_value=1)
+        get_file_metadata(self.storage, "photo.png", 'size', compute)
+        get_file_metadata(self.storage, "photo.png", 'size', compute)
+        self.assertEqual(2, compute.call_count)
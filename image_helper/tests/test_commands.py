@@ -0,0 +1,192 @@
+import hashlib
+import os
+from io import StringIO
+from os.path import dirname
+from unittest import mock
+
+from django import test
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+
+from PIL import Image
+
+from image_helper.management.base import batches
+from image_helper.management.commands import delete_orphaned_images
+from image_helper.management.commands.delete_orphaned_images import _walk
+from image_helper.tests.test_app.models import RenditionModel, CleanupModel, FormatModel, MetadataModel
+from image_helper.tests.utils import get_sample_photo, TestImagesMixin
+
+
+class RegenerateImagesTests(TestImagesMixin, test.TestCase):
+    def setUp(self):
+        upload_file = get_sample_photo()
+        self.model = RenditionModel.objects.create(image=upload_file)
+        self.model = RenditionModel.objects.get(pk=self.model.pk)
+
+    def _call_command(self, *args):
+        out = StringIO()
+        call_command('regenerate_images', 'test_app.RenditionModel.image', '--workers=0', *args,
+                     stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_regenerates_renditions(self):
+        os.remove(self.model.image.small.path)
+        Image.new('RGB', (10, 10)).save(self.model.image.medium.path)
+
+        output = self._call_command()
+
+        self.assertIn("Regenerated 1, skipped 0, failed 0.", output)
+        self.assertEqual((50, 33), Image.open(self.model.image.small.path).size)
+        self.assertEqual((120, 79), Image.open(self.model.image.medium.path).size)
+
+    def test_updates_metadata_of_regenerated_renditions(self):
+        model = MetadataModel.objects.create(image=get_sample_photo())
+        metadata = MetadataModel.objects.get(pk=model.pk).image_metadata
+        metadata['renditions']['thumbnail'].update(bytes=0, hash='stale')
+        del metadata['webp']
+        MetadataModel.objects.filter(pk=model.pk).update(image_metadata=metadata)
+
+        call_command('regenerate_images', 'test_app.MetadataModel.image', '--workers=0',
+                     stdout=StringIO(), stderr=StringIO())
+
+        model = MetadataModel.objects.get(pk=model.pk)
+        with open(model.image.thumbnail.path, 'rb') as f:
+            content = f.read()
+        thumbnail = model.image_metadata['renditions']['thumbnail']
+        self.assertEqual(len(content), thumbnail['bytes'])
+        self.assertEqual(hashlib.sha256(content).hexdigest(), thumbnail['hash'])
+        self.assertEqual(model.image.webp.name, model.image_metadata['webp']['name'])
+
+    def test_keeps_renditions_when_writing_fails(self):
+        with mock.patch.object(FileSystemStorage, '_save', side_effect=IOError("Disk full")):
+            with self.assertRaises(IOError):
+                self._call_command()
+        for rendition in ('thumbnail', 'medium', 'small'):
+            self.assertTrue(os.path.exists(getattr(self.model.image, rendition).path))
+
+    def test_only_missing_skips_complete_images(self):
+        output = self._call_command('--only-missing')
+        self.assertIn("Regenerated 0, skipped 1, failed 0.", output)
+
+        os.remove(self.model.image.thumbnail.path)
+        output = self._call_command('--only-missing')
+        self.assertIn("Regenerated 1, skipped 0, failed 0.", output)
+        self.assertTrue(os.path.exists(self.model.image.thumbnail.path))
+
+    def test_since_skips_older_images(self):
+        output = self._call_command('--since=2999-01-01')
+        self.assertIn("Regenerated 0, skipped 1, failed 0.", output)
+
+    def test_processes_every_batch(self):
+        RenditionModel.objects.create(image=self.model.image.name)
+        output = self._call_command('--batch-size=1')
+        self.assertIn("Regenerated 2, skipped 0, failed 0.", output)
+
+    def test_batches_consume_iterators(self):
+        self.assertEqual([[0, 1], [2, 3], [4]], list(batches(iter(range(5)), 2)))
+        self.assertEqual([], list(batches(iter([]), 2)))
+
+    def test_dry_run_does_not_write(self):
+        os.remove(self.model.image.small.path)
+
+        output = self._call_command('--dry-run', '--only-missing')
+
+        self.assertIn(self.model.image.name, output)
+        self.assertIn("Would regenerate 1 images.", output)
+        self.assertFalse(os.path.exists(self.model.image.small.path))
+
+    def test_reports_failures_without_stopping(self):
+        with open(self.model.image.path, 'wb') as f:
+            f.write(b"not an image")
+        output = self._call_command()
+        self.assertIn("Regenerated 0, skipped 0, failed 1.", output)
+
+    def test_rejects_unknown_field(self):
+        with self.assertRaises(CommandError):
+            call_command('regenerate_images', 'test_app.RenditionModel.missing')
+
+
+class DeleteOrphanedImagesTests(TestImagesMixin, test.TestCase):
+    def setUp(self):
+        upload_file = get_sample_photo()
+        self.model = CleanupModel.objects.create(image=upload_file)
+        self.orphans = []
+        for name in ("orphan.png", "orphan-thumbnail.png", "nested/sample_photo-thumbnail.png"):
+            path = os.path.join(settings.MEDIA_ROOT, "test_images", name)
+            os.makedirs(dirname(path), exist_ok=True)
+            Image.new('RGB', (10, 10)).save(path)
+            self.orphans.append(path)
+
+    def _call_command(self, *args):
+        out = StringIO()
+        call_command('delete_orphaned_images', 'test_app.CleanupModel.image', '--min-age=0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_unreferenced_files(self):
+        output = self._call_command('--batch-size=2')
+
+        self.assertIn("Deleted 3 orphaned files.", output)
+        self.assertFalse(any(os.path.exists(path) for path in self.orphans))
+        for path in (self.model.image.path, self.model.image.webp.path,
+                     self.model.image.thumbnail.path, self.model.image.thumbnail.webp.path):
+            self.assertTrue(os.path.exists(path))
+
+    def test_keeps_files_of_images_with_any_extension(self):
+        CleanupModel.objects.create(image="test_images/other.JPEG")
+        kept = []
+        for name in ("other.JPEG", "other.webp", "other-thumbnail.JPEG", "other-thumbnail.webp"):
+            path = os.path.join(settings.MEDIA_ROOT, "test_images", name)
+            Image.new('RGB', (10, 10)).save(path, 'WEBP' if name.endswith('.webp') else 'JPEG')
+            kept.append(path)
+
+        output = self._call_command()
+
+        self.assertIn("Deleted 3 orphaned files.", output)
+        self.assertTrue(all(os.path.exists(path) for path in kept))
+
+    def test_looks_images_up_by_name_or_prefix(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._call_command('--dry-run')
+        self.assertTrue(queries.captured_queries)
+        self.assertFalse([query for query in queries.captured_queries if "LIKE '%" in query['sql']])
+
+    def test_looks_images_of_webp_copies_up_by_stem(self):
+        field = CleanupModel._meta.get_field('image')
+        command = delete_orphaned_images.Command()
+        self.assertEqual(({"test_images/photo-thumbnail.webp", "test_images/photo.webp"},
+                          {"test_images/photo-thumbnail", "test_images/photo"}),
+                         command._get_candidate_images(field, "test_images/photo-thumbnail.webp"))
+
+    def test_looks_images_of_field_with_format_up_by_its_extensions(self):
+        field = FormatModel._meta.get_field('image')
+        command = delete_orphaned_images.Command()
+        image_extensions = delete_orphaned_images._get_image_extensions(field.encode_options['format'])
+        names, stems = command._get_candidate_images(field, "test_images/photo-thumbnail.webp", image_extensions)
+        self.assertFalse(stems)
+        self.assertIn("test_images/photo.jpg", names)
+        self.assertLessEqual(len(names), 10)
+
+    def test_walks_storages_without_local_paths(self):
+        listings = {"images": (["nested"], ["a.png"]), "images/nested": ([], ["b.png"])}
+        storage = mock.Mock(path=mock.Mock(side_effect=NotImplementedError), listdir=listings.get)
+        self.assertEqual(["images/a.png", "images/nested/b.png"], list(_walk(storage, "images")))
+
+    def test_dry_run_does_not_delete(self):
+        output = self._call_command('--dry-run')
+
+        self.assertIn("test_images/orphan.png", output)
+        self.assertIn("Would delete 3 orphaned files.", output)
+        self.assertTrue(all(os.path.exists(path) for path in self.orphans))
+
+    def test_keeps_recent_files(self):
+        output = self._call_command('--min-age=60')
+        self.assertIn("Deleted 0 orphaned files.", output)
+
+    def test_rejects_fields_on_other_storages(self):
+        with self.assertRaises(CommandError):
+            with mock.patch.object(RenditionModel._meta.get_field('image'), 'storage',
+                                   FileSystemStorage(location='/tmp/other')):
+                self._call_command('test_app.RenditionModel.image')
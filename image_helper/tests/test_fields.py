@@ -1,40 +1,42 @@
 import os
-import shutil
-from os.path import join, dirname
+import hashlib
+import time
+from io import BytesIO
 
-from django import test
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django import forms, test
+from django.core.exceptions import ValidationError
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.db import transaction
+from django.db.models.fields.files import ImageFieldFile
 from django.core.management import call_command
 from django.conf import settings
+from unittest import mock
 
-from image_helper.tests.test_app.models import TestModel
-from image_helper.fields import _get_thumbnail_filename
+from PIL import Image, ImageCms, ImageFile
 
+from image_helper.tests.test_app.models import (
+    TestModel, RenditionModel, DeferredModel, FormatModel, ContentAddressedModel, CleanupModel, MetadataModel,
+    DeferredMetadataModel, LeadingColumnsModel)
+from image_helper.fields import SizedImageField, ThumbnailField, _get_thumbnail_filename, _get_format_filename
+from image_helper.limits import ResizeSlotTimeout, resize_slot
+from image_helper.naming import AvailableName, ShardedName, UUIDName, get_naming
+from image_helper.tests.utils import get_sample_photo, TestImagesMixin
 
-class SizedImageFieldTests(test.TestCase):
+
+class SizedImageFieldTests(TestImagesMixin, test.TestCase):
     def setUp(self):
         call_command("migrate", verbosity=0)
 
-    def tearDown(self):
-        test_images_path = os.path.join(settings.MEDIA_ROOT, "test_images")
-        if os.path.exists(test_images_path):
-            shutil.rmtree(test_images_path)
-
-    def _get_simple_uploaded_file(self):
-        return SimpleUploadedFile(
-            "sample_photo.png",
-            open(join(dirname(__file__), "test_app/sample_photo.png"),
-                 'rb').read(),
-            content_type="image/png")
-
     def _save_image_model(self):
-        upload_file = self._get_simple_uploaded_file()
+        upload_file = get_sample_photo()
         m = TestModel(image=upload_file)
         m.save()
         return m
 
     def test_saves_image_and_thumbnail(self):
-        upload_file = self._get_simple_uploaded_file()
+        upload_file = get_sample_photo()
         m = TestModel(image=upload_file)
         m.save()
 
@@ -80,6 +82,417 @@ class SizedImageFieldTests(test.TestCase):
         self.assertEqual(True, os.path.exists(model.image.thumbnail.path))
 
 
+class SizedImageFieldFileTests(test.TestCase):
+    def test_renditions_are_built_on_first_access(self):
+        field = TestModel._meta.get_field('image')
+        with mock.patch.object(field, '_get_rendition_file', wraps=field._get_rendition_file) as get_rendition_file:
+            model = TestModel(id=1, image="test_images/photo.png")
+            self.assertEqual(0, get_rendition_file.call_count)
+
+            self.assertEqual("test_images/photo-thumbnail.png", model.image.thumbnail.name)
+            self.assertIs(model.image.thumbnail, model.image.thumbnail)
+            self.assertEqual(1, get_rendition_file.call_count)
+
+    def test_rendition_follows_file_name(self):
+        model = TestModel(image="test_images/photo.png")
+        self.assertEqual("test_images/photo-thumbnail.png", model.image.thumbnail.name)
+        model.image.name = "test_images/photo_AbC12.png"
+        self.assertEqual("test_images/photo_AbC12-thumbnail.png", model.image.thumbnail.name)
+
+    def test_empty_file_has_no_renditions(self):
+        model = TestModel()
+        self.assertFalse(hasattr(model.image, 'thumbnail'))
+        self.assertFalse(hasattr(model.image, 'missing'))
+
+
+class ProbeTests(TestImagesMixin, test.TestCase):
+    def _get_jpeg(self, orientation=None):
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        handle = BytesIO()
+        Image.new('RGB', (300, 200), 'red').save(handle, 'JPEG', exif=exif.tobytes())
+        return handle.getvalue()
+
+    def test_reuses_image_verified_by_form(self):
+        upload = forms.ImageField().clean(SimpleUploadedFile("photo.jpg", self._get_jpeg(orientation=6)))
+        field = TestModel._meta.get_field('image')
+
+        with mock.patch('image_helper.fields.Image.open') as image_open:
+            probe = field._probe(upload)
+        image_open.assert_not_called()
+        self.assertEqual(('JPEG', (300, 200), 'RGB', 6), probe)
+        self.assertIs(probe, field._probe(upload))
+
+    def test_probes_header_of_other_uploads(self):
+        probe = TestModel._meta.get_field('image')._probe(SimpleUploadedFile("photo.jpg", self._get_jpeg()))
+        self.assertEqual(('JPEG', (300, 200), 'RGB', 1), probe)
+
+    def test_dimension_fields_use_probe(self):
+        upload = forms.ImageField().clean(SimpleUploadedFile("photo.jpg", self._get_jpeg()))
+        with mock.patch.object(ImageFieldFile, '_get_image_dimensions') as get_image_dimensions:
+            model = MetadataModel(image=upload)
+        get_image_dimensions.assert_not_called()
+        self.assertEqual((300, 200), (model.width, model.height))
+
+    def test_dimension_fields_use_orientation(self):
+        upload = forms.ImageField().clean(SimpleUploadedFile("photo.jpg", self._get_jpeg(orientation=6)))
+        model = MetadataModel(image=upload)
+        self.assertEqual((200, 300), (model.width, model.height))
+
+    def test_opens_temporary_upload_from_its_path(self):
+        upload = TemporaryUploadedFile("photo.jpg", "image/jpeg", 0, None)
+        upload.write(self._get_jpeg())
+        upload.seek(0)
+
+        with mock.patch('image_helper.fields.Image.open', wraps=Image.open) as image_open:
+            model = TestModel.objects.create(image=upload)
+
+        image_open.assert_called_once_with(upload.temporary_file_path())
+        self.assertEqual((220, 147), Image.open(model.image.path).size)
+
+
+class EncodeTests(test.TestCase):
+    def setUp(self):
+        self.field = TestModel._meta.get_field('image')
+        self.image = Image.new('RGB', (300, 200), 'blue')
+
+    def test_encodes_image_into_file_ready_to_save(self):
+        encoded = self.field._get_simple_uploaded_file(self.image, "photo.png")
+
+        expected = BytesIO()
+        self.image.save(expected, 'PNG')
+        self.assertEqual("photo.png", encoded.name)
+        self.assertEqual("image/png", encoded.content_type)
+        self.assertEqual(len(expected.getvalue()), encoded.size)
+        self.assertEqual(expected.getvalue(), b''.join(encoded.chunks()))
+
+    def test_keeps_small_images_in_memory(self):
+        for file_name in ("photo.png", "photo.jpg", "photo.gif", "photo.webp"):
+            encoded = self.field._get_simple_uploaded_file(self.image, file_name)
+            self.assertFalse(encoded.file._rolled, file_name)
+
+    def test_spools_large_images_to_disk(self):
+        with self.settings(IMAGE_HELPER_SPOOL_MAX_SIZE=100):
+            encoded = self.field._get_simple_uploaded_file(self.image, "photo.png")
+        self.assertTrue(encoded.file._rolled)
+        self.assertEqual(encoded.size, len(encoded.read()))
+
+    def test_spools_large_jpegs_to_disk(self):
+        with self.settings(IMAGE_HELPER_SPOOL_MAX_SIZE=100):
+            encoded = self.field._get_simple_uploaded_file(self.image, "photo.jpg")
+        self.assertTrue(encoded.file._rolled)
+        self.assertEqual('JPEG', Image.open(encoded).format)
+
+
+class OutputFormatTests(TestImagesMixin, test.TestCase):
+    def _save_format_model(self):
+        upload_file = get_sample_photo()
+        m = FormatModel(image=upload_file)
+        m.save()
+        return FormatModel.objects.get(pk=m.pk)
+
+    def test_saves_image_in_field_format(self):
+        model = self._save_format_model()
+        self.assertEqual("test_images/sample_photo.jpg", model.image.name)
+        image = Image.open(model.image.path)
+        self.assertEqual('JPEG', image.format)
+        self.assertTrue(image.info.get('progressive'))
+
+    def test_saves_renditions_in_their_format(self):
+        model = self._save_format_model()
+        self.assertEqual("test_images/sample_photo-thumbnail.webp", model.image.thumbnail.name)
+        self.assertEqual('WEBP', Image.open(model.image.thumbnail.path).format)
+        self.assertEqual("test_images/sample_photo-small.jpg", model.image.small.name)
+        self.assertEqual('JPEG', Image.open(model.image.small.path).format)
+
+    def test_saves_webp_copy_of_rendition(self):
+        model = self._save_format_model()
+        self.assertEqual("{}test_images/sample_photo-small.webp".format(settings.MEDIA_URL),
+                         model.image.small.webp.url)
+        self.assertEqual('WEBP', Image.open(model.image.small.webp.path).format)
+        self.assertFalse(hasattr(model.image, 'webp'))
+        self.assertFalse(hasattr(model.image.thumbnail, 'webp'))
+
+    def test_passes_quality_to_pil(self):
+        field = FormatModel._meta.get_field('image')
+        image = Image.new('RGB', (100, 100), 'green')
+        low = field._get_simple_uploaded_file(image, "photo.jpg", {'quality': 10})
+        high = field._get_simple_uploaded_file(image, "photo.jpg", {'quality': 95})
+        self.assertLess(low.size, high.size)
+
+    def test_get_format_filename(self):
+        self.assertEqual("photo.webp", _get_format_filename("photo.png", 'WEBP'))
+        self.assertEqual("photo.jpeg", _get_format_filename("photo.jpeg", 'JPEG'))
+        self.assertEqual("photo.png", _get_format_filename("photo.png", None))
+
+    def test_rejects_formats_pillow_cannot_save(self):
+        # PSD is read only, ABC isn't a format.
+        for pil_format in ('PSD', 'ABC'):
+            with self.assertRaises(ValueError):
+                SizedImageField(format=pil_format)
+            with self.assertRaises(ValueError):
+                SizedImageField(renditions={'small': {'size': (100, 100), 'format': pil_format}})
+
+    def test_rejects_webp_copies_without_webp_support(self):
+        with mock.patch.dict(Image.SAVE):
+            del Image.SAVE['WEBP']
+            with self.assertRaises(ValueError):
+                SizedImageField(renditions={'small': {'size': (100, 100), 'webp': True}})
+
+
+class ContentAddressedTests(TestImagesMixin, test.TestCase):
+    def _save_model(self):
+        upload_file = get_sample_photo()
+        m = ContentAddressedModel(image=upload_file)
+        m.save()
+        return ContentAddressedModel.objects.get(pk=m.pk)
+
+    def test_names_file_after_its_content(self):
+        model = self._save_model()
+        self.assertRegex(model.image.name, r'^test_images/[0-9a-f]{32}\.png$')
+        self.assertEqual(_get_thumbnail_filename(model.image.name), model.image.thumbnail.name)
+        self.assertTrue(os.path.exists(model.image.thumbnail.path))
+
+    def test_reuses_stored_image_without_resizing(self):
+        first = self._save_model()
+        with mock.patch.object(SizedImageField, '_resize_image') as resize_image:
+            second = self._save_model()
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(0, resize_image.call_count)
+        self.assertEqual(sorted([os.path.basename(first.image.name), os.path.basename(first.image.thumbnail.name)]),
+                         sorted(os.listdir(os.path.dirname(first.image.path))))
+
+    def test_recreates_missing_rendition(self):
+        first = self._save_model()
+        os.remove(first.image.thumbnail.path)
+
+        second = self._save_model()
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(os.path.exists(second.image.thumbnail.path))
+
+    def test_name_changes_with_field_options(self):
+        upload_file = SimpleUploadedFile("photo.png", b"content")
+        small = SizedImageField(size=(100, 100), content_addressed=True)
+        large = SizedImageField(size=(200, 200), content_addressed=True)
+        self.assertNotEqual(small._get_content_file_name(upload_file), large._get_content_file_name(upload_file))
+        self.assertEqual(small._get_content_file_name(upload_file), small._get_content_file_name(upload_file))
+
+
+class CleanupTests(TestImagesMixin, test.TestCase):
+    def _get_stored_paths(self, model):
+        return [model.image.path, model.image.webp.path, model.image.thumbnail.path, model.image.thumbnail.webp.path]
+
+    def test_stored_filenames_include_renditions_and_webp_copies(self):
+        field = CleanupModel._meta.get_field('image')
+        self.assertEqual(['a/photo.png', 'a/photo.webp', 'a/photo-thumbnail.png', 'a/photo-thumbnail.webp'],
+                         field._get_stored_filenames('a/photo.png'))
+
+    def test_deletes_image_and_renditions_with_model(self):
+        model = CleanupModel.objects.get(pk=CleanupModel.objects.create(image=get_sample_photo()).pk)
+        paths = self._get_stored_paths(model)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            model.delete()
+            self.assertTrue(os.path.exists(paths[0]))
+        for callback in callbacks:
+            callback()
+
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+    def test_deletes_replaced_image(self):
+        model = CleanupModel.objects.get(pk=CleanupModel.objects.create(image=get_sample_photo()).pk)
+        old_paths = self._get_stored_paths(model)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            model.image = get_sample_photo("other_photo.png")
+            model.save()
+
+        self.assertFalse(any(os.path.exists(path) for path in old_paths))
+        self.assertTrue(all(os.path.exists(path) for path in self._get_stored_paths(model)))
+
+    def test_saving_same_image_deletes_nothing(self):
+        model = CleanupModel.objects.get(pk=CleanupModel.objects.create(image=get_sample_photo()).pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            model.save()
+        self.assertEqual([], callbacks)
+
+    def test_new_instance_deletes_nothing(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            CleanupModel.objects.create(image=get_sample_photo())
+        self.assertEqual([], callbacks)
+
+    def test_keeps_images_other_rows_reference(self):
+        model = CleanupModel.objects.create(image=get_sample_photo())
+        CleanupModel.objects.create(image=model.image.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            model.delete()
+
+        self.assertTrue(os.path.exists(model.image.path))
+
+    def test_batches_deletes_of_a_transaction(self):
+        for _ in range(3):
+            CleanupModel.objects.create(image=get_sample_photo())
+
+        with mock.patch.object(SizedImageField, '_delete_images') as delete_images:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                CleanupModel.objects.all().delete()
+
+        self.assertEqual(1, len(callbacks))
+        delete_images.assert_called_once()
+        self.assertEqual(3, len(delete_images.call_args[0][0]))
+
+    @test.override_settings(IMAGE_HELPER_DELETE_BATCH_SIZE=2)
+    def test_splits_large_batches(self):
+        for _ in range(3):
+            CleanupModel.objects.create(image=get_sample_photo())
+
+        with mock.patch.object(SizedImageField, '_delete_images') as delete_images:
+            with self.captureOnCommitCallbacks(execute=True):
+                CleanupModel.objects.all().delete()
+
+        self.assertEqual(2, delete_images.call_count)
+
+
+class MetadataTests(TestImagesMixin, test.TestCase):
+    def _describe(self, path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        image = Image.open(path)
+        return {'name': os.path.relpath(path, settings.MEDIA_ROOT), 'width': image.width, 'height': image.height,
+                'bytes': len(content), 'format': image.format, 'hash': hashlib.sha256(content).hexdigest()}
+
+    def test_saves_columns_declared_before_the_image(self):
+        model = LeadingColumnsModel.objects.create(image=get_sample_photo())
+        saved = LeadingColumnsModel.objects.get(pk=model.pk)
+
+        self.assertEqual(model.image.name, saved.image_metadata['name'])
+        self.assertEqual(model.image_placeholder, saved.image_placeholder)
+        self.assertTrue(saved.image_placeholder.startswith('#'))
+
+    def test_records_image_and_renditions(self):
+        model = MetadataModel.objects.create(image=get_sample_photo())
+        metadata = MetadataModel.objects.get(pk=model.pk).image_metadata
+
+        webp = metadata.pop('webp')
+        thumbnail = metadata.pop('renditions')['thumbnail']
+        self.assertEqual(self._describe(model.image.path), metadata)
+        self.assertEqual(self._describe(model.image.webp.path), webp)
+        self.assertEqual(self._describe(model.image.thumbnail.webp.path), thumbnail.pop('webp'))
+        self.assertEqual(self._describe(model.image.thumbnail.path), thumbnail)
+        self.assertEqual((100, 66), (thumbnail['width'], thumbnail['height']))
+
+    def test_reads_sizes_and_dimensions_without_storage(self):
+        model = MetadataModel.objects.create(image=get_sample_photo())
+
+        with mock.patch.object(ImageFieldFile, '_get_image_dimensions') as get_image_dimensions, \
+                mock.patch.object(model.image.storage, 'size') as size, \
+                mock.patch.object(model.image.storage, 'open') as storage_open:
+            model = MetadataModel.objects.get(pk=model.pk)
+            self.assertEqual((220, 145), (model.width, model.height))
+            self.assertEqual((220, 145), (model.image.width, model.image.height))
+            self.assertEqual(model.image_metadata['bytes'], model.image.size)
+            self.assertEqual((100, 66), (model.image.thumbnail.width, model.image.thumbnail.height))
+            self.assertTrue(model.image.thumbnail.size)
+            self.assertEqual((100, 66), model.image.field._get_dimensions(model.image, 'thumbnail'))
+
+        get_image_dimensions.assert_not_called()
+        size.assert_not_called()
+        storage_open.assert_not_called()
+
+    def test_ignores_metadata_of_another_file(self):
+        model = MetadataModel.objects.create(image=get_sample_photo())
+        model.image_metadata['name'] = 'test_images/other.png'
+        self.assertIsNone(model.image.metadata)
+        self.assertEqual((100, 66), (model.image.thumbnail.width, model.image.thumbnail.height))
+
+    @test.override_settings(IMAGE_HELPER_TASK_BACKEND='image_helper.tasks.SyncBackend')
+    def test_deferred_processing_records_metadata(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            model = DeferredMetadataModel.objects.create(image=get_sample_photo())
+        self.assertIsNone(model.image_metadata)
+
+        model = DeferredMetadataModel.objects.get(pk=model.pk)
+        metadata = model.image.metadata
+        self.assertEqual(self._describe(model.image.thumbnail.path), metadata.pop('renditions')['thumbnail'])
+        self.assertEqual(self._describe(model.image.path), metadata)
+
+
+class PhotoMetadataTests(TestImagesMixin, test.TestCase):
+    def _get_photo(self, orientation=6, pil_format='JPEG'):
+        """
+        A photo as a phone takes it: sideways, with an EXIF orientation,
+        maker notes and an ICC profile.
+        """
+        image = Image.new('RGB', (400, 300), 'blue')
+        image.paste(Image.new('RGB', (200, 300), 'red'))
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x010f] = 'Phone'
+        exif[0x8769] = {0x927c: b'\0' * 20000}
+        icc_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+        handle = BytesIO()
+        image.save(handle, pil_format, exif=exif.tobytes(), icc_profile=icc_profile)
+        return SimpleUploadedFile("photo." + pil_format.lower(), handle.getvalue())
+
+    def test_applies_orientation(self):
+        model = RenditionModel.objects.create(image=self._get_photo())
+
+        image = Image.open(model.image.path)
+        self.assertEqual((112, 150), image.size)
+        # The left of the sideways photo is its top.
+        self.assertGreater(image.getpixel((56, 10))[0], 200)
+        self.assertGreater(image.getpixel((56, 140))[2], 200)
+        self.assertEqual((37, 50), Image.open(model.image.small.path).size)
+
+    def test_skips_orientation_of_upright_images(self):
+        with mock.patch('image_helper.fields.ImageOps.exif_transpose') as exif_transpose:
+            model = RenditionModel.objects.create(image=self._get_photo(orientation=1))
+        exif_transpose.assert_not_called()
+        self.assertEqual((200, 150), Image.open(model.image.path).size)
+
+    def test_draft_decodes_at_the_oriented_size(self):
+        field = SizedImageField(size=(150, 200))
+        image = Image.open(BytesIO(self._get_photo(orientation=6).read()))
+        self.assertEqual((200, 150), field._draft(image, orientation=6).size)
+
+    def test_strips_metadata(self):
+        model = RenditionModel.objects.create(image=self._get_photo())
+
+        for path in (model.image.path, model.image.thumbnail.path):
+            image = Image.open(path)
+            self.assertEqual({}, dict(image.getexif()), path)
+            self.assertNotIn('icc_profile', image.info, path)
+
+    def test_keeps_metadata_where_configured(self):
+        field = SizedImageField(size=(220, 150), renditions={
+            'thumbnail': (100, 100), 'large': {'size': (200, 200), 'keep_metadata': True}})
+        image = field._open_image(self._get_photo(pil_format='WEBP'))
+
+        encoded = dict(field._render_renditions(image, 'test_images/photo.webp'))
+        kept = Image.open(encoded['test_images/photo-large.webp']).getexif()
+        self.assertEqual('Phone', kept[0x010f])
+        self.assertNotIn(0x0112, kept)
+        self.assertNotIn(0x927c, kept.get_ifd(0x8769))
+        self.assertEqual({}, dict(Image.open(encoded['test_images/photo-thumbnail.webp']).getexif()))
+
+    def test_converts_profile_once_resized(self):
+        with mock.patch.object(SizedImageField, '_convert_to_srgb', autospec=True,
+                               side_effect=SizedImageField._convert_to_srgb) as convert_to_srgb:
+            model = RenditionModel.objects.create(image=self._get_photo())
+        self.assertEqual([(112, 150)], [args[1].size for args, kwargs in convert_to_srgb.call_args_list])
+        self.assertNotIn('icc_profile', Image.open(model.image.small.path).info)
+
+    def test_keeps_profile_without_little_cms(self):
+        with mock.patch('image_helper.fields.ImageCms', None):
+            model = RenditionModel.objects.create(image=self._get_photo())
+        self.assertIn('icc_profile', Image.open(model.image.thumbnail.path).info)
+
+
 class GetThumbnailFilenameTests(test.TestCase):
     def test_get_thumbnail_filename(self):
         thumbnail_name = _get_thumbnail_filename("my_image.jpg")
@@ -89,3 +502,497 @@ class GetThumbnailFilenameTests(test.TestCase):
         thumbnail_name = _get_thumbnail_filename(
             "my_image.jpg", append_text="-small")
         self.assertEqual("my_image-small.jpg", thumbnail_name)
+
+
+class DraftDecodeTests(TestImagesMixin, test.TestCase):
+    def _get_jpeg(self, size=(2000, 1600)):
+        handle = BytesIO()
+        Image.new('RGB', size, 'red').save(handle, 'JPEG')
+        handle.seek(0)
+        return Image.open(handle)
+
+    def test_decodes_jpeg_at_reduced_scale_above_target_size(self):
+        field = TestModel._meta.get_field('image')
+        image = field._draft(self._get_jpeg())
+        self.assertEqual((250, 200), image.size)
+
+    def test_does_not_draft_when_setting_disabled(self):
+        field = TestModel._meta.get_field('image')
+        with self.settings(IMAGE_HELPER_DRAFT_DECODE=False):
+            image = field._draft(self._get_jpeg())
+        self.assertEqual((2000, 1600), image.size)
+
+    def test_saves_resized_jpeg_upload(self):
+        handle = BytesIO()
+        Image.new('RGB', (2000, 1600), 'red').save(handle, 'JPEG')
+        m = TestModel(image=SimpleUploadedFile(
+            "large_photo.jpg", handle.getvalue(), content_type="image/jpeg"))
+        m.save()
+
+        model = TestModel.objects.get(pk=m.pk)
+        self.assertEqual((187, 150), Image.open(model.image.path).size)
+        self.assertEqual((100, 80), Image.open(model.image.thumbnail.path).size)
+
+
+class BudgetTests(TestImagesMixin, test.TestCase):
+    def _get_upload(self, pil_format='JPEG', size=(2000, 1600)):
+        handle = BytesIO()
+        Image.new('RGB', size, 'red').save(handle, pil_format)
+        return SimpleUploadedFile("large_photo." + pil_format.lower(), handle.getvalue())
+
+    @test.override_settings(IMAGE_HELPER_MAX_PIXELS=1000000)
+    def test_rejects_image_over_pixel_budget_before_decoding(self):
+        with mock.patch.object(ImageFile.ImageFile, 'load') as load, self.assertRaises(ValidationError):
+            with transaction.atomic():
+                TestModel.objects.create(image=self._get_upload('PNG'))
+        load.assert_not_called()
+
+    def test_field_pixel_budget_overrides_setting(self):
+        with self.settings(IMAGE_HELPER_MAX_PIXELS=10000):
+            SizedImageField(max_pixels=4000000)._open_image(self._get_upload('PNG'))
+        with self.assertRaises(ValidationError):
+            SizedImageField(max_pixels=10000)._open_image(self._get_upload('PNG'))
+
+    @test.override_settings(IMAGE_HELPER_MAX_BYTES=100)
+    def test_rejects_image_over_byte_budget_in_validation(self):
+        model = TestModel(image=self._get_upload())
+        with self.assertRaises(ValidationError) as context:
+            model.full_clean()
+        self.assertEqual('image_too_large', context.exception.error_dict['image'][0].code)
+
+    @test.override_settings(IMAGE_HELPER_OVER_BUDGET='draft')
+    def test_drafts_jpeg_over_budget(self):
+        field = SizedImageField(max_pixels=1000000)
+        image = field._open_image(self._get_upload())
+        self.assertEqual((1000, 800), image.size)
+
+        field = SizedImageField(max_pixels=10000)
+        with self.assertRaises(ValidationError):
+            field._open_image(self._get_upload())
+
+    @test.override_settings(IMAGE_HELPER_OVER_BUDGET='draft')
+    def test_draft_keeps_field_size_target(self):
+        field = SizedImageField(size=(220, 150), max_pixels=1000000)
+        self.assertEqual((250, 200), field._open_image(self._get_upload()).size)
+
+    @test.override_settings(IMAGE_HELPER_MAX_CONCURRENT_RESIZES=1, IMAGE_HELPER_RESIZE_WAIT_TIMEOUT=0.01)
+    def test_waits_for_a_resize_slot(self):
+        with resize_slot():
+            with self.assertRaises(ResizeSlotTimeout), transaction.atomic():
+                TestModel.objects.create(image=self._get_upload(size=(300, 200)))
+        TestModel.objects.create(image=self._get_upload(size=(300, 200)))
+
+    @test.override_settings(IMAGE_HELPER_MAX_CONCURRENT_RESIZES=1, IMAGE_HELPER_RESIZE_WAIT_TIMEOUT=0.01)
+    def test_writes_renditions_after_giving_the_slot_back(self):
+        save = FileSystemStorage._save
+
+        def save_without_slot(storage, name, content):
+            with resize_slot():
+                return save(storage, name, content)
+
+        with mock.patch.object(FileSystemStorage, '_save', autospec=True, side_effect=save_without_slot):
+            model = TestModel.objects.create(image=self._get_upload(size=(300, 200)))
+        self.assertEqual((100, 67), Image.open(model.image.thumbnail.path).size)
+
+
+class LatencyStorage(FileSystemStorage):
+    """
+    Local storage standing in for a remote one: every write takes `latency`
+    seconds, and writing a name containing `fail` raises.
+    """
+    def __init__(self, latency=0.3, fail=None):
+        super(LatencyStorage, self).__init__()
+        self.latency = latency
+        self.fail = fail
+
+    def _save(self, name, content):
+        time.sleep(self.latency)
+        if self.fail and self.fail in name:
+            raise IOError("Failed to write {}".format(name))
+        return super(LatencyStorage, self)._save(name, content)
+
+
+class RemoteStorage(FileSystemStorage):
+    """
+    Local storage standing in for a remote one: files have no path, and
+    saving overwrites.
+    """
+    def path(self, name):
+        raise NotImplementedError
+
+    def _path(self, name):
+        return os.path.join(self.location, name)
+
+    def _open(self, name, mode='rb'):
+        return File(open(self._path(name), mode))
+
+    def _save(self, name, content):
+        os.makedirs(os.path.dirname(self._path(name)), exist_ok=True)
+        with open(self._path(name), 'wb') as f:
+            for chunk in content.chunks():
+                f.write(chunk)
+        return name
+
+    def delete(self, name):
+        if os.path.exists(self._path(name)):
+            os.remove(self._path(name))
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+
+class ConcurrentWriteTests(TestImagesMixin, test.TestCase):
+    def _create(self, storage):
+        field = RenditionModel._meta.get_field('image')
+        with mock.patch.object(field, 'storage', storage), mock.patch.object(field, 'concurrent_writes', True):
+            return RenditionModel.objects.create(image=self._get_upload())
+
+    def _get_upload(self):
+        handle = BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(handle, 'PNG')
+        return SimpleUploadedFile("image.png", handle.getvalue(), content_type="image/png")
+
+    def _get_saved_files(self):
+        test_images_path = os.path.join(settings.MEDIA_ROOT, "test_images")
+        if not os.path.exists(test_images_path):
+            return []
+        return os.listdir(test_images_path)
+
+    def test_waits_for_the_slowest_write(self):
+        storage = LatencyStorage(latency=0.3)
+        start = time.monotonic()
+        instance = self._create(storage)
+        elapsed = time.monotonic() - start
+
+        # The image and its thumbnail, small and medium renditions would
+        # take 1.2s one after the other.
+        self.assertLess(elapsed, 0.9)
+        for filename in RenditionModel._meta.get_field('image')._get_stored_filenames(instance.image.name):
+            self.assertTrue(storage.exists(filename), filename)
+
+    def test_deletes_written_files_when_a_rendition_fails(self):
+        with self.assertRaises(IOError), transaction.atomic():
+            self._create(LatencyStorage(latency=0.05, fail='-small'))
+
+        self.assertEqual([], self._get_saved_files())
+        self.assertFalse(RenditionModel.objects.exists())
+
+    def test_deletes_renditions_when_the_image_fails(self):
+        with self.assertRaises(IOError), transaction.atomic():
+            self._create(LatencyStorage(latency=0.05, fail='/image.'))
+
+        self.assertEqual([], self._get_saved_files())
+
+    def test_writes_one_after_the_other_by_default(self):
+        field = RenditionModel._meta.get_field('image')
+        with mock.patch.object(field, 'storage', LatencyStorage(latency=0)), \
+                mock.patch('image_helper.fields.get_write_executor') as get_write_executor:
+            instance = RenditionModel.objects.create(image=self._get_upload())
+
+        get_write_executor.assert_not_called()
+        self.assertTrue(instance.image.small.exists())
+
+
+class NamingTests(TestImagesMixin, test.TestCase):
+    def _create(self, naming):
+        handle = BytesIO()
+        Image.new('RGB', (400, 300), 'red').save(handle, 'PNG')
+        field = RenditionModel._meta.get_field('image')
+        with mock.patch.object(field, 'naming', naming):
+            return RenditionModel.objects.create(
+                image=SimpleUploadedFile("image.png", handle.getvalue(), content_type="image/png"))
+
+    def test_sharded_names_dont_probe_storage(self):
+        storage = RenditionModel._meta.get_field('image').storage
+        with mock.patch.object(storage, 'exists') as exists, \
+                mock.patch.object(storage, 'get_available_name') as get_available_name:
+            instance = self._create(ShardedName())
+
+        exists.assert_not_called()
+        get_available_name.assert_not_called()
+        self.assertRegex(instance.image.name, r'^test_images/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{28}\.png$')
+        instance.refresh_from_db()
+        for filename in RenditionModel._meta.get_field('image')._get_stored_filenames(instance.image.name):
+            self.assertTrue(storage.exists(filename), filename)
+        self.assertEqual(instance.image.name[:-4] + '-thumbnail.png', instance.image.thumbnail.name)
+
+    def test_uuid_names_are_unique(self):
+        first = self._create(UUIDName())
+        second = self._create(UUIDName())
+
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^test_images/[0-9a-f]{32}\.png$')
+        self.assertTrue(second.image.small.exists())
+
+    def test_available_names_keep_the_upload_name(self):
+        first = self._create(AvailableName())
+        second = self._create(AvailableName())
+
+        self.assertEqual('test_images/image.png', first.image.name)
+        self.assertNotEqual(first.image.name, second.image.name)
+        self.assertTrue(second.image.thumbnail.exists())
+
+    def test_get_naming(self):
+        self.assertIsInstance(get_naming('sharded'), ShardedName)
+        self.assertIsInstance(get_naming('image_helper.naming.UUIDName'), UUIDName)
+        naming = ShardedName(depth=1)
+        self.assertIs(naming, get_naming(naming))
+        with self.assertRaises(ValueError):
+            get_naming('random')
+
+
+class ProcessBatchTests(TestImagesMixin, test.TestCase):
+    def _get_upload(self, color='red'):
+        handle = BytesIO()
+        Image.new('RGB', (400, 300), color).save(handle, 'PNG')
+        return SimpleUploadedFile(color + ".png", handle.getvalue(), content_type="image/png")
+
+    def test_processes_instances_for_bulk_create(self):
+        field = RenditionModel._meta.get_field('image')
+        instances = [RenditionModel(image=self._get_upload(color)) for color in ('red', 'green', 'blue')]
+
+        failed = field.process_batch(instances, workers=0)
+
+        self.assertEqual([], failed)
+        RenditionModel.objects.bulk_create(instances)
+        self.assertEqual(3, RenditionModel.objects.count())
+        names = set()
+        for instance in RenditionModel.objects.all():
+            names.add(instance.image.name)
+            self.assertEqual((200, 150), (instance.image.width, instance.image.height))
+            for filename in field._get_stored_filenames(instance.image.name):
+                self.assertTrue(field.storage.exists(filename), filename)
+        self.assertEqual(3, len(names))
+
+    def test_reports_failures_without_aborting(self):
+        field = RenditionModel._meta.get_field('image')
+        broken = RenditionModel(image=SimpleUploadedFile("broken.png", b"not an image", content_type="image/png"))
+        valid = RenditionModel(image=self._get_upload())
+
+        failed = field.process_batch([broken, valid], workers=0)
+
+        self.assertEqual(1, len(failed))
+        self.assertIs(broken, failed[0][0])
+        self.assertIn('UnidentifiedImageError', failed[0][1])
+        self.assertFalse(broken.image._committed)
+        self.assertTrue(valid.image._committed)
+        self.assertTrue(valid.image.thumbnail.exists())
+
+    def test_saves_uploads_with_the_same_name_one_at_a_time(self):
+        field = RenditionModel._meta.get_field('image')
+        first, second = RenditionModel(image=self._get_upload()), RenditionModel(image=self._get_upload())
+
+        self.assertEqual([], field.process_batch([first, second], workers=0))
+
+        self.assertNotEqual(first.image.name, second.image.name)
+        for instance in (first, second):
+            for filename in field._get_stored_filenames(instance.image.name):
+                self.assertTrue(field.storage.exists(filename), filename)
+
+    def test_reuses_identical_content_addressed_uploads(self):
+        field = ContentAddressedModel._meta.get_field('image')
+        first, second = ContentAddressedModel(image=self._get_upload()), ContentAddressedModel(image=self._get_upload())
+
+        self.assertEqual([], field.process_batch([first, second], workers=0))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(second.image._committed)
+        self.assertTrue(second.image.thumbnail.exists())
+
+    def test_skips_committed_images(self):
+        instance = RenditionModel.objects.create(image=self._get_upload())
+        name = instance.image.name
+
+        self.assertEqual([], RenditionModel._meta.get_field('image').process_batch([instance, RenditionModel()]))
+        self.assertEqual(name, instance.image.name)
+
+    def test_records_metadata(self):
+        field = MetadataModel._meta.get_field('image')
+        instance = MetadataModel(image=self._get_upload())
+
+        self.assertEqual([], field.process_batch([instance], workers=0))
+        MetadataModel.objects.bulk_create([instance])
+
+        instance = MetadataModel.objects.get()
+        self.assertEqual((200, 150), (instance.width, instance.height))
+        self.assertEqual(instance.image.name, instance.image_metadata['name'])
+        self.assertEqual(100, instance.image_metadata['renditions']['thumbnail']['width'])
+
+    def test_processes_on_worker_processes(self):
+        field = RenditionModel._meta.get_field('image')
+        instances = [RenditionModel(image=self._get_upload(color)) for color in ('red', 'green')]
+
+        self.assertEqual([], field.process_batch(instances, workers=2))
+        for instance in instances:
+            self.assertTrue(instance.image._committed)
+            self.assertTrue(instance.image.small.exists())
+
+
+class RenditionTests(TestImagesMixin, test.TestCase):
+    def _save_rendition_model(self):
+        upload_file = get_sample_photo()
+        m = RenditionModel(image=upload_file)
+        m.save()
+        return RenditionModel.objects.get(pk=m.pk)
+
+    def test_saves_every_rendition(self):
+        model = self._save_rendition_model()
+
+        for rendition, size in [('medium', (120, 79)), ('thumbnail', (100, 66)), ('small', (50, 33))]:
+            rendition_file = getattr(model.image, rendition)
+            self.assertEqual("test_images/sample_photo-{}.png".format(rendition), rendition_file.name)
+            self.assertEqual("{}test_images/sample_photo-{}.png".format(settings.MEDIA_URL, rendition),
+                             rendition_file.url)
+            self.assertEqual(size, Image.open(rendition_file.path).size)
+
+    def test_decodes_upload_once(self):
+        with mock.patch('image_helper.fields.Image.open', wraps=Image.open) as image_open:
+            self._save_rendition_model()
+        self.assertEqual(1, image_open.call_count)
+
+    def test_downsamples_each_rendition_from_the_previous_one(self):
+        field = RenditionModel._meta.get_field('image')
+        source_widths = []
+        do_resize = SizedImageField._do_resize
+
+        def record_source(self, img, dimensions, options=None):
+            source_widths.append(img.width)
+            return do_resize(self, img, dimensions, options)
+
+        with mock.patch.object(SizedImageField, '_do_resize', record_source):
+            self._save_rendition_model()
+
+        self.assertEqual([439, 220, 120, 100], source_widths)
+        self.assertEqual(['medium', 'thumbnail', 'small'], list(field.renditions))
+
+    def test_forced_size_renditions_resize_from_full_image(self):
+        field = SizedImageField(renditions={'big': (200, 200)})
+        image = Image.new('RGB', (400, 300))
+        self.assertTrue(field._can_resize_from(Image.new('RGB', (200, 150)), image, (100, 100, False)))
+        self.assertFalse(field._can_resize_from(Image.new('RGB', (200, 150)), image, (100, 100, True)))
+        self.assertFalse(field._can_resize_from(Image.new('RGB', (80, 60)), image, (100, 100, False)))
+
+    def test_dimensions_scale_stored_dimensions_to_rendition(self):
+        field = SizedImageField(size=(220, 150), width_field='width', height_field='height',
+                                renditions={'small': (100, 100), 'square': (100, 100, True)})
+        image_field = mock.Mock(instance=mock.Mock(width=220, height=145))
+
+        self.assertEqual((220, 145), field._get_dimensions(image_field))
+        self.assertEqual((100, 66), field._get_dimensions(image_field, 'small'))
+        self.assertEqual((100, 100), field._get_dimensions(image_field, 'square'))
+
+    def test_dimensions_are_unknown_without_stored_dimensions(self):
+        field = SizedImageField(size=(220, 150), renditions={'small': (100, 100), 'square': (100, 100, True)})
+        self.assertIsNone(field._get_dimensions(mock.Mock()))
+        self.assertIsNone(field._get_dimensions(mock.Mock(), 'small'))
+        self.assertEqual((100, 100), field._get_dimensions(mock.Mock(), 'square'))
+
+    def test_rejects_rendition_names_that_clash_with_file_attributes(self):
+        for name in ('url', 'metadata', 'placeholder'):
+            with self.assertRaises(ValueError):
+                SizedImageField(renditions={name: (100, 100)})
+
+
+class ResampleTests(test.TestCase):
+    def test_balanced_preset_is_default(self):
+        field = SizedImageField(size=(100, 100))
+        self.assertEqual((Image.LANCZOS, 2.0), field._get_resample(field.resize_options))
+
+    def test_accepts_filter_names_and_explicit_reducing_gap(self):
+        field = SizedImageField(size=(100, 100), resample='bicubic', reducing_gap=None)
+        self.assertEqual((Image.BICUBIC, None), field._get_resample(field.resize_options))
+        field = SizedImageField(size=(100, 100), resample='fast', reducing_gap=3.0)
+        self.assertEqual((Image.BILINEAR, 3.0), field._get_resample(field.resize_options))
+
+    def test_rejects_unknown_resample(self):
+        with self.assertRaises(ValueError):
+            SizedImageField(resample='lanczoz')
+        with self.assertRaises(ValueError):
+            SizedImageField(renditions={'small': {'size': (50, 50), 'resample': 'lanczoz'}})
+        with self.assertRaises(ValueError):
+            SizedImageField(resample=42)
+
+    def test_renditions_inherit_and_override_resample(self):
+        field = SizedImageField(resample='quality', renditions={
+            'small': (50, 50), 'medium': {'size': (120, 120), 'resample': 'fast'}})
+        self.assertEqual('quality', field.renditions['small']['resample'])
+        self.assertEqual('fast', field.renditions['medium']['resample'])
+
+    def test_passes_filter_to_pil(self):
+        field = SizedImageField(resample='fast')
+        image = Image.new('RGB', (400, 300))
+        with mock.patch.object(image, 'thumbnail') as thumbnail:
+            field._do_resize(image, (100, 100, False), field.resize_options)
+        thumbnail.assert_called_once_with((100, 100), Image.BILINEAR, reducing_gap=1.5)
+
+    def test_forced_size_crops_to_aspect_ratio(self):
+        field = SizedImageField()
+        image = Image.new('RGB', (400, 200), 'red')
+        image.paste((0, 0, 255), (80, 0, 320, 200))
+
+        resized = field._do_resize(image, (50, 50, True))
+
+        self.assertEqual((50, 50), resized.size)
+        self.assertEqual((0, 0, 255), resized.getpixel((0, 0)))
+        self.assertEqual((0, 0, 255), resized.getpixel((49, 49)))
+
+
+@test.override_settings(IMAGE_HELPER_TASK_BACKEND='image_helper.tasks.SyncBackend')
+class DeferredTests(TestImagesMixin, test.TestCase):
+    def _save_deferred_model(self):
+        upload_file = get_sample_photo()
+        m = DeferredModel(image=upload_file)
+        m.save()
+        return m
+
+    def test_saves_only_original_until_transaction_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            m = self._save_deferred_model()
+
+        model = DeferredModel.objects.get(pk=m.pk)
+        self.assertEqual(1, len(callbacks))
+        self.assertEqual((439, 289), Image.open(model.image.path).size)
+        self.assertFalse(os.path.exists(model.image.thumbnail.path))
+        self.assertEqual(model.image.url, model.image.thumbnail.url)
+
+    def test_resizes_and_creates_thumbnail_in_backend(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            m = self._save_deferred_model()
+
+        model = DeferredModel.objects.get(pk=m.pk)
+        self.assertEqual("test_images/sample_photo.png", model.image.name)
+        self.assertEqual((220, 145), Image.open(model.image.path).size)
+        self.assertEqual((100, 66), Image.open(model.image.thumbnail.path).size)
+        self.assertEqual("{}test_images/sample_photo-thumbnail.png".format(settings.MEDIA_URL),
+                         model.image.thumbnail.url)
+
+    def test_keeps_original_when_resized_image_fails_to_save(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            m = self._save_deferred_model()
+
+        with mock.patch.object(FileSystemStorage, '_save', side_effect=IOError("Disk full")):
+            with self.assertRaises(IOError):
+                callbacks[0]()
+
+        self.assertTrue(os.path.exists(m.image.path))
+        self.assertEqual((439, 289), Image.open(m.image.path).size)
+        self.assertEqual([], [name for name in os.listdir(os.path.dirname(m.image.path)) if 'replacing' in name])
+
+    def test_replaces_original_with_resized_image_on_remote_storage(self):
+        field = DeferredModel._meta.get_field('image')
+        with self.captureOnCommitCallbacks() as callbacks:
+            m = self._save_deferred_model()
+
+        with mock.patch.object(field, 'storage', RemoteStorage()), \
+                mock.patch('image_helper.fields.os.replace') as replace:
+            callbacks[0]()
+
+        replace.assert_not_called()
+        self.assertEqual((220, 145), Image.open(m.image.path).size)
+        self.assertEqual([], [name for name in os.listdir(os.path.dirname(m.image.path)) if 'replacing' in name])
+
+    def test_thumbnail_url_uses_placeholder_until_it_exists(self):
+        field = DeferredModel._meta.get_field('image')
+        thumbnail = ThumbnailField("test_images/missing-thumbnail.png", field.storage,
+                                   "test_images/missing.png", "/static/pending.png")
+        self.assertEqual("/static/pending.png", thumbnail.url)
@@ -0,0 +1,106 @@
+import os
+from os.path import join
+from unittest import mock
+
+from django import test
+from django.conf import settings
+
+from image_helper import metrics
+from image_helper.signals import image_stage_finished
+from image_helper.tests.test_app.models import TestModel
+from image_helper.tests.utils import get_sample_photo, TestImagesMixin
+
+
+class FailingSink(metrics.BaseMetricsSink):
+    def record(self, model, field, stage, duration, **event):
+        raise ConnectionError("Metrics server is down")
+
+
+class StageMetricsTests(TestImagesMixin, test.TestCase):
+    def setUp(self):
+        self.events = []
+        image_stage_finished.connect(self._receiver)
+        self.addCleanup(image_stage_finished.disconnect, self._receiver)
+
+    def _receiver(self, sender, **kwargs):
+        self.events.append(dict(kwargs, sender=sender))
+
+    def _save_image_model(self):
+        upload_file = get_sample_photo()
+        return TestModel.objects.create(image=upload_file)
+
+    def test_sends_signal_for_every_stage(self):
+        self._save_image_model()
+
+        self.assertEqual(['open', 'convert', 'resize', 'rendition', 'encode', 'encode', 'storage_save', 'storage_save'],
+                         [event['stage'] for event in self.events])
+        for event in self.events:
+            self.assertIs(TestModel, event['sender'])
+            self.assertIs(TestModel._meta.get_field('image'), event['field'])
+            self.assertGreaterEqual(event['duration'], 0)
+
+    def test_events_describe_images_and_bytes(self):
+        self._save_image_model()
+        events = dict((event['stage'], event) for event in self.events)
+
+        self.assertEqual((439, 289), events['open']['input_size'])
+        self.assertEqual((439, 289), events['resize']['input_size'])
+        self.assertEqual((220, 145), events['resize']['output_size'])
+        self.assertEqual((100, 66), events['rendition']['output_size'])
+        self.assertEqual("test_images/sample_photo-thumbnail.png", events['rendition']['name'])
+
+        saves = [event for event in self.events if event['stage'] == 'storage_save']
+        self.assertEqual(os.path.getsize(join(settings.MEDIA_ROOT, "test_images/sample_photo-thumbnail.png")),
+                         saves[0]['bytes_written'])
+        self.assertEqual(os.path.getsize(join(settings.MEDIA_ROOT, "test_images/sample_photo.png")),
+                         saves[1]['bytes_written'])
+
+    def test_reports_stages_that_raise_as_failed(self):
+        field = TestModel._meta.get_field('image')
+        with self.assertRaises(IOError):
+            with metrics.measure_stage(field, 'storage_save', name="test_images/photo.png"):
+                raise IOError("Disk full")
+
+        self.assertEqual(1, len(self.events))
+        self.assertEqual('storage_save', self.events[0]['stage'])
+        self.assertTrue(self.events[0]['failed'])
+
+    @test.override_settings(IMAGE_HELPER_METRICS_SINK='image_helper.tests.test_metrics.FailingSink')
+    def test_failing_sink_does_not_fail_upload(self):
+        with self.assertLogs('image_helper.metrics', 'ERROR'):
+            model = self._save_image_model()
+        self.assertTrue(os.path.exists(model.image.thumbnail.path))
+        self.assertFalse(any(event['failed'] for event in self.events))
+
+    @test.override_settings(IMAGE_HELPER_METRICS_SINK='image_helper.metrics.InMemoryMetricsSink')
+    def test_records_to_configured_sink(self):
+        sink = metrics.get_sink()
+        sink.reset()
+
+        self._save_image_model()
+
+        self.assertEqual(2, sink.counts[('test_app.TestModel', 'image', 'encode')])
+        self.assertIn('image_helper_stage_total{model="test_app.TestModel",field="image",stage="resize"} 1',
+                      sink.render())
+        self.assertIn('image_helper_stage_failures_total{model="test_app.TestModel",field="image",stage="resize"} 0',
+                      sink.render())
+
+
+class StatsdMetricsSinkTests(test.TestCase):
+    @test.override_settings(IMAGE_HELPER_STATSD_ADDRESS=('statsd', 8125))
+    def test_sends_timer_and_bytes(self):
+        sink = metrics.StatsdMetricsSink()
+        with mock.patch.object(sink, 'socket') as sock:
+            sink.record('test_app.TestModel', 'image', 'encode', 0.0125, bytes_written=2048)
+
+        sock.sendto.assert_called_once_with(
+            b'image_helper.test_app_TestModel.image.encode:12.500|ms\n'
+            b'image_helper.test_app_TestModel.image.encode.bytes:2048|c',
+            ('statsd', 8125))
+
+    def test_counts_failures(self):
+        sink = metrics.StatsdMetricsSink()
+        with mock.patch.object(sink, 'socket') as sock:
+            sink.record('test_app.TestModel', 'image', 'open', 0.001, failed=True)
+
+        self.assertIn(b'image_helper.test_app_TestModel.image.open.failed:1|c', sock.sendto.call_args[0][0])
@@ -0,0 +1,108 @@
+import base64
+from io import BytesIO
+from unittest import mock
+
+from django import test
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from PIL import Image
+
+from image_helper.fields import SizedImageField
+from image_helper.placeholders import (
+    BASE83, get_blurhash, get_dominant_color, get_placeholder_attributes, get_webp)
+from image_helper.tests.test_app.models import DeferredPlaceholderModel, PlaceholderModel
+from image_helper.tests.utils import TestImagesMixin
+
+
+def _decode83(value):
+    result = 0
+    for character in value:
+        result = result * 83 + BASE83.index(character)
+    return result
+
+
+def _get_upload(color='red', size=(400, 300)):
+    handle = BytesIO()
+    image = Image.new('RGB', size, 'white')
+    image.paste(Image.new('RGB', (size[0], size[1] * 3 // 4), color))
+    image.save(handle, 'PNG')
+    return SimpleUploadedFile("image.png", handle.getvalue(), content_type="image/png")
+
+
+class PlaceholderTests(test.TestCase):
+    def test_blurhash(self):
+        blurhash = get_blurhash(Image.new('RGB', (400, 300), 'red'))
+
+        self.assertEqual(28, len(blurhash))
+        # 4x3 components.
+        self.assertEqual('L', blurhash[0])
+        self.assertEqual(0xff0000, _decode83(blurhash[2:6]))
+
+    def test_blurhash_components(self):
+        image = Image.linear_gradient('L').resize((300, 200))
+
+        self.assertEqual(6 + 2 * 3, len(get_blurhash(image, components=(2, 2))))
+        self.assertNotEqual(get_blurhash(image), get_blurhash(image.transpose(Image.FLIP_TOP_BOTTOM)))
+
+    def test_dominant_color(self):
+        image = Image.new('RGB', (400, 300), 'white')
+        image.paste(Image.new('RGB', (400, 200), (0, 0, 255)))
+
+        self.assertEqual('#0000ff', get_dominant_color(image))
+
+    def test_webp(self):
+        placeholder = get_webp(Image.new('RGB', (400, 300), 'red'))
+
+        self.assertTrue(placeholder.startswith('data:image/webp;base64,'))
+        image = Image.open(BytesIO(base64.b64decode(placeholder.split(',', 1)[1])))
+        self.assertEqual(('WEBP', (16, 12)), (image.format, image.size))
+
+    def test_attributes(self):
+        self.assertEqual([('style', 'background-color: #0000ff')], get_placeholder_attributes('#0000ff'))
+        self.assertEqual([('data-blurhash', 'LEHV6nWB2yk8pyo0adR*.7kCMdnj')],
+                         get_placeholder_attributes('LEHV6nWB2yk8pyo0adR*.7kCMdnj'))
+        self.assertIn('background-image: url(data:image/webp;base64,AAAA)',
+                      get_placeholder_attributes('data:image/webp;base64,AAAA')[0][1])
+        self.assertEqual([], get_placeholder_attributes(None))
+
+    def test_rejects_unknown_placeholder(self):
+        with self.assertRaises(ValueError):
+            SizedImageField(placeholder='svg')
+
+
+class FieldPlaceholderTests(TestImagesMixin, test.TestCase):
+    def test_stores_placeholder(self):
+        model = PlaceholderModel.objects.create(image=_get_upload('blue'))
+
+        self.assertEqual('#0000ff', model.image.placeholder)
+        self.assertEqual('#0000ff', PlaceholderModel.objects.get().image_placeholder)
+
+    def test_computes_placeholder_from_decoded_image(self):
+        field = PlaceholderModel._meta.get_field('image')
+        with mock.patch.object(field, 'placeholder', 'webp'), \
+                mock.patch.object(Image, 'open', wraps=Image.open) as image_open:
+            model = PlaceholderModel.objects.create(image=_get_upload())
+
+        self.assertEqual(1, image_open.call_count)
+        self.assertTrue(model.image.placeholder.startswith('data:image/webp;base64,'))
+
+    def test_no_placeholder_without_field(self):
+        model = PlaceholderModel()
+        self.assertIsNone(model.image.placeholder)
+
+    @test.override_settings(IMAGE_HELPER_TASK_BACKEND='image_helper.tasks.SyncBackend')
+    def test_deferred_processing_stores_placeholder(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            model = DeferredPlaceholderModel.objects.create(image=_get_upload())
+        self.assertIsNone(model.image.placeholder)
+
+        model.refresh_from_db()
+        self.assertEqual(28, len(model.image.placeholder))
+
+    def test_process_batch_stores_placeholder(self):
+        model = PlaceholderModel(image=_get_upload('blue'))
+
+        self.assertEqual([], PlaceholderModel._meta.get_field('image').process_batch([model], workers=0))
+        PlaceholderModel.objects.bulk_create([model])
+
+        self.assertEqual('#0000ff', PlaceholderModel.objects.get().image.placeholder)
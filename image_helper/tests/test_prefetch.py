@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django import test
+from django.core.cache import cache
+
+from image_helper.prefetch import prefetch_renditions
+from image_helper.tests.test_app.models import DeferredModel, RenditionModel
+
+
+class PrefetchRenditionsTests(test.TestCase):
+    def setUp(self):
+        cache.clear()
+        for name in ('one', 'two', 'three'):
+            RenditionModel.objects.create(image='test_images/{}.png'.format(name))
+        self.storage = RenditionModel._meta.get_field('image').storage
+
+    def test_resolves_urls_once_for_all_instances(self):
+        instances = list(RenditionModel.objects.order_by('pk'))
+        with mock.patch.object(self.storage, 'url', side_effect=lambda name: '/media/' + name) as url:
+            prefetch_renditions(instances, 'image', ['thumbnail'])
+            self.assertEqual(3, url.call_count)
+            self.assertEqual('/media/test_images/one-thumbnail.png', instances[0].image.thumbnail.url)
+            self.assertEqual(3, url.call_count)
+
+    def test_reads_and_fills_the_cache_in_bulk(self):
+        instances = list(RenditionModel.objects.all())
+        with mock.patch.object(self.storage, 'url', side_effect=lambda name: '/media/' + name) as url:
+            prefetch_renditions(instances, 'image', ['thumbnail'])
+            prefetch_renditions(list(RenditionModel.objects.all()), 'image', ['thumbnail'])
+        self.assertEqual(3, url.call_count)
+
+    def test_uses_bulk_storage_lookups(self):
+        size_many = mock.Mock(side_effect=lambda names: dict((name, 10) for name in names))
+        with mock.patch.object(self.storage, 'size_many', size_many, create=True), \
+                mock.patch.object(self.storage, 'size') as size:
+            instances = prefetch_renditions(
+                list(RenditionModel.objects.all()), 'image', ['small', 'medium'], lookups=['size'])
+        self.assertEqual(2, size_many.call_count)
+        size.assert_not_called()
+        self.assertEqual(10, instances[0].image.small.size)
+
+    def test_resolves_existence_of_deferred_renditions(self):
+        DeferredModel.objects.create(image='test_images/one.png')
+        instances = prefetch_renditions(DeferredModel.objects.all(), 'image', ['thumbnail'])
+        with mock.patch.object(self.storage, 'exists') as exists:
+            self.assertEqual('/media/test_images/one.png', instances[0].image.thumbnail.url)
+        exists.assert_not_called()
+
+    def test_rejects_unknown_lookups(self):
+        with self.assertRaises(ValueError):
+            prefetch_renditions([], 'image', lookups=['path'])
+
+    def test_queryset_prefetches_the_fetched_page(self):
+        queryset = RenditionModel.objects.prefetch_renditions('image', ['thumbnail']).order_by('pk')
+        with mock.patch('image_helper.prefetch.prefetch_renditions') as prefetch:
+            page = list(queryset[:2])
+        prefetch.assert_called_once_with(page, 'image', ['thumbnail'], ('url',))
+
+    def test_queryset_skips_values(self):
+        queryset = RenditionModel.objects.prefetch_renditions('image', ['thumbnail'])
+        with mock.patch('image_helper.prefetch.prefetch_renditions') as prefetch:
+            list(queryset.values_list('image', flat=True))
+        prefetch.assert_not_called()
@@ -0,0 +1,65 @@
+import threading
+from unittest import mock
+
+from django import test
+
+from image_helper import tasks
+from image_helper.tests.test_app.models import DeferredModel
+
+
+class TaskBackendTests(test.TestCase):
+    def test_sync_backend_runs_right_away(self):
+        func = mock.Mock()
+        tasks.SyncBackend().submit(func, "a", "b")
+        func.assert_called_once_with("a", "b")
+
+    def test_thread_pool_backend_runs_on_executor(self):
+        future = tasks.ThreadPoolBackend().submit(str.upper, "image")
+        self.assertEqual("IMAGE", future.result(timeout=5))
+
+    def test_thread_pool_backend_logs_failures(self):
+        func = mock.Mock(side_effect=IOError("Disk full"), __name__='process_image')
+        with self.assertLogs('image_helper.tasks', 'ERROR') as logs:
+            future = tasks.ThreadPoolBackend().submit(func, "test_images/photo.png")
+            # Callbacks run in the order they're added, this one after the backend's.
+            logged = threading.Event()
+            future.add_done_callback(lambda future: logged.set())
+            logged.wait(timeout=5)
+
+        self.assertIn("process_image('test_images/photo.png',) failed.", logs.output[0])
+        self.assertIn("OSError: Disk full", logs.output[0])
+
+    def test_process_pool_backend_sets_workers_up(self):
+        with mock.patch.object(tasks.ProcessPoolBackend, 'executor_class') as executor_class:
+            tasks.ProcessPoolBackend()
+        executor_class.assert_called_once_with(max_workers=2, initializer=tasks._setup_worker)
+
+    def test_thread_pool_backend_drops_old_connections_around_work(self):
+        with mock.patch('image_helper.tasks.close_old_connections') as close_old_connections:
+            future = tasks.ThreadPoolBackend().submit(str.upper, "image")
+            self.assertEqual("IMAGE", future.result(timeout=5))
+        self.assertEqual(2, close_old_connections.call_count)
+
+    def test_setup_worker_forgets_inherited_connections_without_closing_them(self):
+        inherited = mock.Mock()
+        connection = mock.Mock(connection=inherited)
+        with mock.patch('image_helper.tasks.django.setup') as setup, \
+                mock.patch('image_helper.tasks.connections.all', return_value=[connection]), \
+                mock.patch('image_helper.tasks._inherited_connections', []) as kept:
+            tasks._setup_worker()
+        setup.assert_called_once_with()
+        self.assertIsNone(connection.connection)
+        self.assertFalse(connection.close.called)
+        self.assertFalse(inherited.close.called)
+        self.assertEqual([inherited], kept)
+
+    @test.override_settings(IMAGE_HELPER_TASK_BACKEND='image_helper.tasks.SyncBackend')
+    def test_get_backend_reuses_configured_backend(self):
+        backend = tasks.get_backend()
+        self.assertIsInstance(backend, tasks.SyncBackend)
+        self.assertIs(backend, tasks.get_backend())
+
+    def test_process_image_looks_up_field(self):
+        with mock.patch.object(DeferredModel._meta.get_field('image'), '_process_stored_image') as process:
+            tasks.process_image('test_app.DeferredModel', 'image', 'test_images/photo.png')
+        process.assert_called_once_with('test_images/photo.png')
@@ -0,0 +1,76 @@
+from io import BytesIO
+from unittest import mock
+
+from django import test
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+
+from PIL import Image
+
+from image_helper.tests.test_app.models import DeferredModel, PlaceholderModel, RenditionModel
+from image_helper.tests.utils import get_sample_photo, TestImagesMixin
+
+
+class ResponsiveImageTests(TestImagesMixin, test.TestCase):
+    def setUp(self):
+        cache.clear()
+        upload_file = get_sample_photo()
+        self.model = RenditionModel.objects.create(image=upload_file)
+
+    def _render(self, template, model=None):
+        return Template("{% load image_helper_tags %}" + template).render(Context({'obj': model or self.model}))
+
+    def test_renders_srcset_of_renditions(self):
+        html = self._render('{% responsive_image obj.image sizes="50vw" alt="A photo" class="photo" data_id="7" %}')
+
+        self.assertIn('src="/media/test_images/sample_photo.png"', html)
+        self.assertIn('srcset="/media/test_images/sample_photo-small.png 50w, '
+                      '/media/test_images/sample_photo-thumbnail.png 100w, '
+                      '/media/test_images/sample_photo-medium.png 120w, '
+                      '/media/test_images/sample_photo.png 220w"', html)
+        self.assertIn('sizes="50vw" width="220" height="145"', html)
+        self.assertIn('alt="A photo" loading="lazy" decoding="async" class="photo" data-id="7"', html)
+
+    def test_lists_the_stored_width_of_tall_images(self):
+        handle = BytesIO()
+        Image.new('RGB', (300, 1200), 'red').save(handle, 'PNG')
+        model = RenditionModel.objects.create(image=SimpleUploadedFile("tall.png", handle.getvalue()))
+
+        html = self._render('{% responsive_image obj.image %}', model)
+
+        self.assertIn('srcset="/media/test_images/tall-small.png 12w, /media/test_images/tall-thumbnail.png 25w, '
+                      '/media/test_images/tall-medium.png 30w, /media/test_images/tall.png 37w"', html)
+        self.assertIn('width="37" height="150"', html)
+
+    def test_caches_markup(self):
+        storage = self.model.image.storage
+        self._render('{% responsive_image obj.image %}')
+        with mock.patch.object(storage, 'url') as url:
+            html = self._render('{% responsive_image obj.image %}')
+        url.assert_not_called()
+        self.assertIn('srcset=', html)
+
+    def test_cache_key_includes_arguments(self):
+        self._render('{% responsive_image obj.image sizes="50vw" %}')
+        self.assertIn('sizes="25vw"', self._render('{% responsive_image obj.image sizes="25vw" %}'))
+
+    def test_renders_placeholder(self):
+        model = PlaceholderModel(image=self.model.image.name, image_placeholder='#0000ff')
+        html = self._render('{% responsive_image obj.image %}', model)
+        self.assertIn('style="background-color: #0000ff"', html)
+        self.assertEqual('#0000ff', self._render('{{ obj.image.placeholder }}', model))
+
+    def test_skips_renditions_that_are_not_created_yet(self):
+        model = DeferredModel(image='test_images/processing.png')
+        html = self._render('{% responsive_image obj.image %}', model)
+        self.assertIn('src="/media/test_images/processing.png"', html)
+        self.assertNotIn('srcset', html)
+        self.assertNotIn('width=', html)
+
+    def test_renders_nothing_without_image(self):
+        self.assertEqual('', self._render('{% responsive_image obj.image %}', RenditionModel()))
+
+    def test_srcset_filter(self):
+        self.assertIn('/media/test_images/sample_photo-small.png 50w',
+                      self._render('{{ obj.image|srcset }}'))
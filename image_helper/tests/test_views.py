@@ -0,0 +1,102 @@
+import os
+import threading
+from unittest import mock
+
+from django import test
+from django.conf import settings
+from django.core.cache import cache
+
+from PIL import Image
+
+from image_helper.fields import SizedImageField
+from image_helper.tests.test_app.models import OnDemandModel
+from image_helper.tests.utils import get_sample_photo, TestImagesMixin
+
+
+class RenditionViewMixin(TestImagesMixin):
+    def setUp(self):
+        cache.clear()
+        upload_file = get_sample_photo()
+        m = OnDemandModel.objects.create(image=upload_file)
+        self.model = OnDemandModel.objects.get(pk=m.pk)
+        self.url = "/images/test_app.ondemandmodel/image/small/test_images/sample_photo.png"
+
+
+@test.override_settings(ROOT_URLCONF='image_helper.tests.urls')
+class RenditionViewTests(RenditionViewMixin, test.TestCase):
+    def test_on_demand_rendition_is_not_created_on_save(self):
+        self.assertTrue(os.path.exists(self.model.image.thumbnail.path))
+        self.assertFalse(os.path.exists(self.model.image.small.path))
+        self.assertEqual(self.url, self.model.image.small.url)
+        self.assertEqual(self.url + "?webp=1", self.model.image.small.webp.url)
+
+    def test_generates_rendition_and_redirects_to_it(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(302, response.status_code)
+        self.assertEqual("{}test_images/sample_photo-small.png".format(settings.MEDIA_URL), response['Location'])
+        self.assertEqual((50, 33), Image.open(self.model.image.small.path).size)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertEqual(response['Location'], OnDemandModel.objects.get(pk=self.model.pk).image.small.url)
+
+    def test_generates_webp_copy(self):
+        response = self.client.get(self.url + "?webp=1")
+        self.assertEqual("{}test_images/sample_photo-small.webp".format(settings.MEDIA_URL), response['Location'])
+        self.assertEqual('WEBP', Image.open(self.model.image.small.webp.path).format)
+
+    def test_webp_copy_of_rendition_without_webp_is_not_found(self):
+        field = OnDemandModel._meta.get_field('image')
+        with mock.patch.dict(field.renditions['small'], {'webp': False}):
+            response = self.client.get(self.url + "?webp=1")
+        self.assertEqual(404, response.status_code)
+        self.assertEqual(['sample_photo-thumbnail.png', 'sample_photo.png'],
+                         sorted(os.listdir(os.path.dirname(self.model.image.path))))
+
+    def test_overwrites_rendition_created_meanwhile(self):
+        field = OnDemandModel._meta.get_field('image')
+        with open(self.model.image.thumbnail.path, 'rb') as f:
+            field.storage.save(self.model.image.small.name, f)
+
+        field._create_rendition(self.model.image.name, 'small')
+
+        self.assertEqual((50, 33), Image.open(self.model.image.small.path).size)
+        self.assertEqual(['sample_photo-small.png', 'sample_photo-small.webp', 'sample_photo-thumbnail.png',
+                          'sample_photo.png'],
+                         sorted(os.listdir(os.path.dirname(self.model.image.path))))
+
+    def test_answers_conditional_requests(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+    @test.override_settings(IMAGE_HELPER_ON_DEMAND_RESPONSE='serve')
+    def test_can_serve_rendition(self):
+        response = self.client.get(self.url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('image/png', response['Content-Type'])
+        with open(self.model.image.small.path, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(response.streaming_content))
+
+    def test_unknown_images_and_renditions_are_not_found(self):
+        self.assertEqual(404, self.client.get(
+            "/images/test_app.ondemandmodel/image/small/test_images/other.png").status_code)
+        self.assertEqual(404, self.client.get(
+            "/images/test_app.ondemandmodel/image/thumbnail/test_images/sample_photo.png").status_code)
+        self.assertEqual(404, self.client.get(
+            "/images/test_app.missing/image/small/test_images/sample_photo.png").status_code)
+
+
+@test.override_settings(ROOT_URLCONF='image_helper.tests.urls')
+class ConcurrentRenditionViewTests(RenditionViewMixin, test.TransactionTestCase):
+    def test_generates_rendition_once_for_concurrent_requests(self):
+        create_rendition = SizedImageField._create_rendition
+        with mock.patch.object(SizedImageField, '_create_rendition', autospec=True,
+                               side_effect=create_rendition) as create:
+            threads = [threading.Thread(target=self.client.get, args=(self.url, )) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(1, create.call_count)
@@ -0,0 +1,50 @@
+from django import test
+from django.core.files.storage import FileSystemStorage
+
+from image_helper.tests.test_app.models import PlaceholderModel, RenditionModel, TestModel
+from image_helper.tests.utils import get_sample_photo, TestImagesMixin
+from image_helper.widgets import AdminImagePreviewWidget
+
+
+class AdminImagePreviewWidgetTests(TestImagesMixin, test.TestCase):
+    def setUp(self):
+        upload_file = get_sample_photo()
+        self.model = TestModel.objects.create(image=upload_file)
+
+    def test_previews_thumbnail_lazily(self):
+        html = AdminImagePreviewWidget().render('image', self.model.image)
+
+        self.assertIn('src="{}"'.format(self.model.image.thumbnail.url), html)
+        self.assertIn('width="100" height="66"', html)
+        self.assertIn('loading="lazy" decoding="async"', html)
+        self.assertNotIn('srcset', html)
+
+    def test_shows_placeholder(self):
+        model = PlaceholderModel(image=self.model.image.name, image_placeholder='#0000ff')
+        html = AdminImagePreviewWidget().render('image', model.image)
+        self.assertIn('object-fit: contain; background-color: #0000ff;', html)
+
+        model.image_placeholder = 'LEHV6nWB2yk8pyo0adR*.7kCMdnj'
+        html = AdminImagePreviewWidget().render('image', model.image)
+        self.assertIn('data-blurhash="LEHV6nWB2yk8pyo0adR*.7kCMdnj"', html)
+
+    def test_previews_given_rendition(self):
+        model = RenditionModel(image=self.model.image.name)
+        html = AdminImagePreviewWidget(rendition='small').render('image', model.image)
+        self.assertIn('src="{}"'.format(model.image.small.url), html)
+
+    def test_uses_storage(self):
+        storage = FileSystemStorage(base_url='https://cdn.example.com/')
+        html = AdminImagePreviewWidget(storage=storage).render('image', self.model.image)
+        self.assertIn('src="https://cdn.example.com/test_images/sample_photo-thumbnail.png"', html)
+
+    def test_srcset_offers_every_rendition(self):
+        model = RenditionModel.objects.create(image=get_sample_photo())
+        html = AdminImagePreviewWidget(srcset=True).render('image', model.image)
+
+        self.assertIn('srcset="{} 120w, {} 100w, {} 50w"'.format(
+            model.image.medium.url, model.image.thumbnail.url, model.image.small.url), html)
+        self.assertIn('sizes="300px"', html)
+
+    def test_renders_nothing_without_image(self):
+        self.assertNotIn('<img', AdminImagePreviewWidget().render('image', None))
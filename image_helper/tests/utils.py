@@ -0,0 +1,28 @@
+import os
+import shutil
+from os.path import join, dirname
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+SAMPLE_PHOTO_PATH = join(dirname(__file__), "test_app/sample_photo.png")
+
+
+def get_sample_photo(name="sample_photo.png"):
+    """
+    Returns an upload of the 439x289 sample PNG, named `name`.
+    """
+    with open(SAMPLE_PHOTO_PATH, 'rb') as f:
+        return SimpleUploadedFile(name, f.read(), content_type="image/png")
+
+
+class TestImagesMixin(object):
+    """
+    Removes the images tests saved under ``MEDIA_ROOT/test_images``.
+    """
+
+    def tearDown(self):
+        super(TestImagesMixin, self).tearDown()
+        test_images_path = os.path.join(settings.MEDIA_ROOT, "test_images")
+        if os.path.exists(test_images_path):
+            shutil.rmtree(test_images_path)
@@ -0,0 +1,10 @@
+from django.urls import re_path
+
+from image_helper import views
+
+app_name = 'image_helper'
+
+urlpatterns = [
+    re_path(r'^(?P<model>[\w]+\.[\w]+)/(?P<field_name>\w+)/(?P<rendition>\w+)/(?P<name>.+)$',
+            views.rendition, name='rendition'),
+]
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from image_helper.conf import get_setting
+from image_helper.fields import SizedImageField, _get_format_filename
+
+# Requests for the same rendition in this process wait on the same lock.
+_locks = [threading.Lock() for _ in range(64)]
+
+
+@contextmanager
+def _rendition_lock(key):
+    """
+    Holds a lock on `key` so only one request generates a rendition while
+    the others wait for it. The lock is shared across processes through
+    the ``IMAGE_HELPER_CACHE`` cache when there is one.
+    """
+    timeout = get_setting('ON_DEMAND_LOCK_TIMEOUT')
+    local_lock = _locks[int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16) % len(_locks)]
+    if not local_lock.acquire(timeout=timeout):
+        raise TimeoutError("Timed out waiting for {}".format(key))
+    try:
+        alias = get_setting('CACHE')
+        if not alias:
+            yield
+            return
+
+        cache = caches[alias]
+        lock_key = 'image_helper:lock:{}'.format(hashlib.md5(key.encode('utf-8')).hexdigest())
+        deadline = time.time() + timeout
+        while not cache.add(lock_key, 1, timeout):
+            if time.time() > deadline:
+                raise TimeoutError("Timed out waiting for {}".format(key))
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            cache.delete(lock_key)
+    finally:
+        local_lock.release()
+
+
+def _get_field(model, field_name, rendition):
+    try:
+        field = apps.get_model(model)._meta.get_field(field_name)
+    except (LookupError, ValueError, FieldDoesNotExist):
+        raise Http404("Unknown field.")
+    if not isinstance(field, SizedImageField) or not field.renditions.get(rendition, {}).get('on_demand'):
+        raise Http404("Unknown rendition.")
+    return field
+
+
+def _get_last_modified(storage, name):
+    try:
+        return int(storage.get_modified_time(name).timestamp())
+    except NotImplementedError:
+        return None
+
+
+@require_safe
+def rendition(request, model, field_name, rendition, name):
+    """
+    Returns a rendition of a `SizedImageField` image, generating and saving
+    it first if it doesn't exist yet.
+
+    Only renditions declared with `on_demand` can be requested, and only for
+    images stored in the field. Responds with a redirect to the stored file,
+    or the file itself, depending on ``IMAGE_HELPER_ON_DEMAND_RESPONSE``.
+    """
+    field = _get_field(model, field_name, rendition)
+    storage = field.storage
+
+    rendition_name = field._get_rendition_filename(name, rendition)
+    if request.GET.get('webp'):
+        if not field.renditions[rendition].get('webp'):
+            raise Http404("Unknown rendition.")
+        rendition_name = _get_format_filename(rendition_name, 'WEBP')
+
+    if not storage.exists(rendition_name):
+        if not field.model._default_manager.filter(**{field.attname: name}).exists():
+            raise Http404("Unknown image.")
+        with _rendition_lock(rendition_name):
+            if not storage.exists(rendition_name):
+                field._create_rendition(name, rendition)
+
+    last_modified = _get_last_modified(storage, rendition_name)
+    etag = quote_etag(hashlib.md5('{}:{}:{}'.format(
+        rendition_name, storage.size(rendition_name), last_modified).encode('utf-8')).hexdigest())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if get_setting('ON_DEMAND_RESPONSE') == 'serve':
+            response = FileResponse(storage.open(rendition_name))
+        else:
+            response = HttpResponseRedirect(storage.url(rendition_name))
+
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=get_setting('ON_DEMAND_MAX_AGE'))
+    return response
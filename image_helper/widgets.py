@@ -1,14 +1,45 @@
 from django.contrib.admin.widgets import AdminFileWidget
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 
+from image_helper.placeholders import get_placeholder_attributes
+
 
 class AdminImagePreviewWidget(AdminFileWidget):
     """
     An admin widget that shows a preview of currently selected image.
+
+    The preview shows a rendition of the image rather than the original,
+    and is only loaded once it scrolls into view, so change forms and
+    inlines with many images stay fast. When the field stores a
+    placeholder, it's shown until the preview loads.
     """
+    # Renditions previewed when the widget isn't given one, in order of
+    # preference.
+    preview_renditions = ('preview', 'thumbnail')
+
+    def __init__(self, attrs=None, storage=None, rendition=None, srcset=False, max_width=300):
+        """
+        :param storage:
+            Storage the preview url is resolved with, instead of the field's.
+
+        :param rendition:
+            Name of the rendition to preview. Defaults to the field's
+            'preview' or 'thumbnail' rendition, or the image itself when it
+            has neither.
+
+        :param srcset:
+            When True, every rendition is offered in a ``srcset`` so high
+            density screens get a sharper preview.
 
-    def __init__(self, attrs=None, storage=None):
+        :param max_width:
+            Width, in pixels, the preview is shown at most.
+        """
         super(AdminImagePreviewWidget, self).__init__(attrs)
+        self.storage = storage
+        self.rendition = rendition
+        self.srcset = srcset
+        self.max_width = max_width
 
     def render(self, name, value, attrs=None, **kwargs):
         content = super(AdminImagePreviewWidget, self).render(
@@ -16,7 +47,48 @@ class AdminImagePreviewWidget(AdminFileWidget):
         return mark_safe(content + self._get_preview_tag(value))
 
     def _get_preview_tag(self, value):
-        if value and hasattr(value, "url"):
-            return '<p class="file-upload current-file-preview">Current Preview:<br />' \
-                   '<img src="{0}" style="max-width: 300px;" /></p>'.format(value.url)
-        return ''
+        if not value or not hasattr(value, "url"):
+            return ''
+
+        renditions = getattr(getattr(value, 'field', None), 'renditions', {})
+        rendition = self.rendition or next(
+            (rendition for rendition in self.preview_renditions if rendition in renditions), None)
+        attributes = [('src', self._get_url(value, rendition))]
+        dimensions = self._get_dimensions(value, rendition)
+        if dimensions:
+            attributes.extend([('width', dimensions[0]), ('height', dimensions[1])])
+        if self.srcset and renditions:
+            attributes.append(('srcset', self._get_srcset(value, renditions)))
+            attributes.append(('sizes', '{}px'.format(self.max_width)))
+        style = 'max-width: {}px; height: auto; object-fit: contain;'.format(self.max_width)
+        for attribute, attribute_value in get_placeholder_attributes(getattr(value, 'placeholder', None)):
+            if attribute == 'style':
+                style = '{} {};'.format(style, attribute_value)
+            else:
+                attributes.append((attribute, attribute_value))
+
+        return format_html(
+            '<p class="file-upload current-file-preview">Current Preview:<br />'
+            '<img {} loading="lazy" decoding="async" style="{}" />'
+            '</p>',
+            format_html_join(' ', '{}="{}"', attributes), style)
+
+    def _get_url(self, value, rendition=None):
+        file = getattr(value, rendition) if rendition else value
+        if self.storage is not None:
+            return self.storage.url(file.name)
+        return file.url
+
+    def _get_dimensions(self, value, rendition=None):
+        field = getattr(value, 'field', None)
+        if not hasattr(field, 'renditions'):
+            return None
+        return field._get_file_dimensions(value, rendition)
+
+    def _get_srcset(self, value, renditions):
+        candidates = []
+        for rendition in renditions:
+            dimensions = self._get_dimensions(value, rendition)
+            if dimensions:
+                candidates.append((self._get_url(value, rendition), dimensions[0]))
+        return ', '.join('{} {}w'.format(url, width) for url, width in candidates)
@@ -11,7 +11,7 @@ setup(
     description="Django helpers for working with images.",
     long_description=open('README.rst', 'r').read(),
     url="https://github.com/madisona/django-image-helper",
-    packages=find_packages(exclude=["example"]),
+    packages=find_packages(exclude=["example", "benchmarks", "benchmarks.*"]),
     install_requires=open('requirements/requirements.txt').read().split('\n'),
     zip_safe=False,
     classifiers = [